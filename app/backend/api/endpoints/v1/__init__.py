@@ -1,8 +1,9 @@
 from fastapi import APIRouter
-from . import home, chat, auth
+from . import home, chat, auth, metrics
 
 router = APIRouter()
 
 router.include_router(home.router)
 router.include_router(chat.router)
-router.include_router(auth.router)
\ No newline at end of file
+router.include_router(auth.router)
+router.include_router(metrics.router)
\ No newline at end of file
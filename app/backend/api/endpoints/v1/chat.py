@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Request, Depends
-from fastapi.responses import StreamingResponse
-from fastapi import File, UploadFile
+import re
 
-from langchain.schema import HumanMessage, AIMessage
+from fastapi import APIRouter, Request, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+from fastapi import UploadFile
 
+from app.backend.core.config import settings
 from app.backend.models.chat import Message
 from app.backend.services.chat_service import generate_chat_response, generate_chat_response_audio
 from app.backend.services.auth_service import get_current_user
@@ -12,6 +14,16 @@ router = APIRouter(
     tags=["chat"],
 )
 
+# entity tags of an If-None-Match header: "*" or a comma-separated list of quoted, possibly weak (W/) tags
+ETAG_PATTERN = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    '''Whether an If-None-Match header matches an ETag, with the weak comparison of RFC 9110 (W/ is ignored).'''
+    if not if_none_match:
+        return False
+    tags = ETAG_PATTERN.findall(if_none_match)
+    return '*' in tags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in tags}
+
 # endpoint to post to for generating chat responses
 @router.post("/chat")
 async def chat(
@@ -83,23 +95,28 @@ async def chat_audio(
 @router.get("/chat/history")
 async def get_chat_history(
     request: Request,
+    response: Response,
+    cursor: int | None = Query(default=None, ge=0, description="next_cursor of the previous page, none for the newest messages"),
+    limit: int = Query(default=settings.chat_history_page_size, ge=1, le=settings.chat_history_max_page_size),
+    if_none_match: str | None = Header(default=None),
     current_user: dict = Depends(get_current_user)
 ):
-    """Get user's chat history for frontend display."""
+    """
+    Get a page of the user's chat history for frontend display, from the newest messages to the oldest.
+    The page is only sent if it changed since the ETag given in If-None-Match, otherwise the response is 304.
+    """
     session_manager = request.app.state.session_manager
     # Use user ID from JWT token instead of session ID
     chat_history = session_manager.get_or_create_history(str(current_user["id"]))
-    
-    # Get messages from RedisChatMessageHistory (for persistence)
-    messages = []
-    for msg in chat_history.chat_message_history.messages:
-        messages.append({
-            "role": "user" if isinstance(msg, HumanMessage) else "assistant",
-            "content": msg.content,
-            "timestamp": getattr(msg, 'timestamp', None)
-        })
-    
-    return {"messages": messages}
+
+    # the page only changes with the history, so its version and the page requested identify it
+    etag = f'W/"{await chat_history.history_version()}-{cursor}-{limit}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    response.headers.update(headers)
+    return await chat_history.history_page(cursor, limit)
 
 # endpoint to clear chat history for the current user session
 @router.delete("/chat/history")
@@ -110,6 +127,7 @@ async def clear_chat_history(
     """Clear user's chat history."""
     session_manager = request.app.state.session_manager
     # Use user ID from JWT token instead of session ID
-    session_manager.clear_history(str(current_user["id"]))
+    # the deletion goes through the blocking Redis client, so keep it off the event loop
+    await run_in_threadpool(session_manager.clear_history, str(current_user["id"]))
     
     return {"message": "Chat history cleared successfully."}
\ No newline at end of file
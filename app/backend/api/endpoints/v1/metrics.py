@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Request
+
+from app.backend.services.news_search import news_search
+
+router = APIRouter(
+    tags=["metrics"],
+)
+
+# endpoint to get the statistics of the HTTP connection pools of the web tools
+@router.get("/metrics/http")
+async def http_metrics(request: Request):
+    return request.app.state.http_clients.stats()
+
+# endpoint to get the cache and coalescing statistics of the news searches
+@router.get("/metrics/news_search")
+async def news_search_metrics():
+    return news_search.stats
+
+# endpoint to get the statistics of the Redis connection pools shared by the chat sessions
+@router.get("/metrics/redis")
+async def redis_metrics(request: Request):
+    return request.app.state.redis_pool.stats()
+
+# endpoint to get the hit rates of the embedding cache of the chat messages
+@router.get("/metrics/embeddings")
+async def embedding_metrics(request: Request):
+    return request.app.state.session_manager.embeddings.stats()
+
+# endpoint to get the depth and throughput of the queue persisting the chat turns
+@router.get("/metrics/persistence")
+async def persistence_metrics(request: Request):
+    return request.app.state.persistence_queue.stats()
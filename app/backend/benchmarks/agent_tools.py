@@ -0,0 +1,133 @@
+'''
+Benchmark of every metric of the agent tools and of the full get_financial_information tool, against recorded market data.
+
+Record the market data of some companies once (needs the network):
+    python -m app.backend.benchmarks.agent_tools record AAPL MSFT KO
+
+Then time the tools against the recording, as often as needed (no network):
+    python -m app.backend.benchmarks.agent_tools run AAPL MSFT KO --repeat 20
+'''
+import argparse
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+def use_scratch_stores() -> str:
+    '''
+    Point the local market data stores to a scratch directory, so that a benchmark does not touch the ones of the app.
+    Must be called before the app modules are imported, since they read the settings when imported.
+
+    Returns:
+        str: The scratch directory, to remove when done
+    '''
+    scratch = tempfile.mkdtemp(prefix='finsight-benchmark-')
+    os.environ['MARKET_DATA_DB_URL'] = f"sqlite:///{os.path.join(scratch, 'market_data.db')}"
+    os.environ['PRICE_STORE_DIR'] = os.path.join(scratch, 'prices')
+    # never refresh what is stored during the run, so that the warm runs only measure the stores
+    os.environ['FUNDAMENTALS_RECHECK_SECONDS'] = str(10 ** 9)
+    os.environ['PRICE_RECHECK_SECONDS'] = str(10 ** 9)
+    return scratch
+
+def _time(fn, repeat: int, setup=None) -> list[float]:
+    '''Time a function a number of times, calling setup (untimed) before every call.'''
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+def _report(name: str, timings: list[float]):
+    timings_ms = [t * 1000 for t in timings]
+    print(f'{name:<45} {statistics.mean(timings_ms):>10.2f} {statistics.median(timings_ms):>10.2f} {min(timings_ms):>10.2f}')
+
+def record(tickers: list[str], directory: str):
+    from app.backend.services.market_data_provider import RecordingProvider, YFinanceProvider, STATEMENTS
+
+    provider = RecordingProvider(YFinanceProvider(), directory)
+    for ticker in tickers:
+        for statement in STATEMENTS:
+            provider.get_statement(ticker, statement)
+        provider.get_info(ticker)
+        provider.get_price_history(ticker)
+        print(f'recorded {ticker} to {directory}')
+
+def run(tickers: list[str], directory: str, repeat: int):
+    from app.backend.services.market_data_provider import ReplayProvider, set_market_data_provider
+    from app.backend.database.market_data import MarketDataBase, get_engine, project_path
+    from app.backend.core.config import settings
+    from app.backend.chatbot.TickerSnapshot import clear_ticker_snapshots
+    from app.backend.chatbot import agent_tools
+
+    set_market_data_provider(ReplayProvider(directory))
+
+    def clear_stores():
+        # forget everything stored locally, as on the first question about a company
+        clear_ticker_snapshots()
+        MarketDataBase.metadata.drop_all(get_engine())
+        MarketDataBase.metadata.create_all(get_engine())
+        shutil.rmtree(project_path(settings.price_store_dir), ignore_errors=True)
+        os.makedirs(project_path(settings.price_store_dir))
+
+    metrics = [
+        agent_tools.calculate_graham_number,
+        agent_tools.discounted_cash_flow,
+        agent_tools.calculate_roe,
+        agent_tools.calculate_roa,
+        agent_tools.get_pe_ratio,
+        agent_tools.get_earnings_yield,
+        agent_tools.get_debt_to_equity_ratio,
+        agent_tools.get_debt_to_asset_ratio,
+        agent_tools.get_gross_profit_margin,
+        agent_tools.get_operating_margin,
+        agent_tools.get_net_profit_margin,
+        agent_tools.get_current_ratio,
+        agent_tools.get_working_capital,
+        agent_tools.get_current_price,
+    ]
+
+    print(f'{"ms, " + str(repeat) + " runs":<45} {"mean":>10} {"median":>10} {"min":>10}')
+    for ticker in tickers:
+        print(f'--- {ticker}')
+        # every metric on its own, with the local stores filled but without the snapshot of the ticker
+        for metric in metrics:
+            _report(metric.__name__, _time(lambda: metric(ticker), repeat, setup=clear_ticker_snapshots))
+
+        # the full tool, from nothing stored, from the local stores, and from the cached snapshot
+        _report('get_financial_information (cold)', _time(lambda: agent_tools.financial_information(ticker), repeat, setup=clear_stores))
+        _report('get_financial_information (stores)', _time(lambda: agent_tools.financial_information(ticker), repeat, setup=clear_ticker_snapshots))
+        _report('get_financial_information (snapshot)', _time(lambda: agent_tools.financial_information(ticker), repeat))
+
+    _report(
+        f'compare_financial_information ({len(tickers)} tickers, cold)',
+        _time(lambda: agent_tools.compare_companies(tickers), repeat, setup=clear_stores)
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['record', 'run'])
+    parser.add_argument('tickers', nargs='+')
+    parser.add_argument('--fixtures', default=None, help='directory of the recorded market data, defaults to settings.market_data_fixtures_dir')
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        scratch = use_scratch_stores()
+
+    from app.backend.core.config import settings
+    directory = args.fixtures or settings.market_data_fixtures_dir
+
+    if args.command == 'record':
+        record(args.tickers, directory)
+    else:
+        try:
+            run(args.tickers, directory, args.repeat)
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
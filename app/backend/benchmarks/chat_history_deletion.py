@@ -0,0 +1,127 @@
+'''
+Check and time the deletion of a session's chat history against a large synthetic keyspace.
+
+Fills Redis with many unrelated keys and with the messages of one session in a scratch chat index (some tracked in
+the key set of the session, some only findable through the index), then clears the session as the app does while
+another client pings Redis, and compares with the KEYS scan it replaced. Fails (exit code 1) if a message of the
+session is left or another key is deleted. Needs Redis Stack, preferably a scratch instance:
+    python -m app.backend.benchmarks.chat_history_deletion --background-keys 1000000 --messages 5000
+'''
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+def _ping_latencies(client, stop: threading.Event) -> list[float]:
+    '''Ping Redis in a loop until stopped, to see how long other clients wait while the deletion runs.'''
+    latencies = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        client.ping()
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.001)
+    return latencies
+
+def _while_pinging(client, fn) -> tuple[float, list[float]]:
+    '''Run fn while another connection pings Redis, and return its duration and the ping latencies.'''
+    stop = threading.Event()
+    latencies = []
+    pinger = threading.Thread(target=lambda: latencies.extend(_ping_latencies(client, stop)))
+    pinger.start()
+    start = time.perf_counter()
+    try:
+        fn()
+    finally:
+        duration = time.perf_counter() - start
+        stop.set()
+        pinger.join()
+    return duration, latencies
+
+def _report(name: str, duration: float, latencies: list[float]):
+    print(f'{name:<40} {duration * 1000:>10.1f} ms   ping p50 {np.percentile(latencies, 50):.2f} ms, '
+          f'p99 {np.percentile(latencies, 99):.2f} ms, max {max(latencies):.2f} ms')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default=None, help='defaults to settings.redis_url')
+    parser.add_argument('--index', default='chat_messages_benchmark', help='scratch index, dropped at the end')
+    parser.add_argument('--background-keys', type=int, default=1000000, help='unrelated keys in the keyspace')
+    parser.add_argument('--messages', type=int, default=5000, help='messages of the cleared session')
+    parser.add_argument('--untracked', type=float, default=0.1, help='share of the messages not in the key set of the session')
+    parser.add_argument('--dim', type=int, default=768)
+    args = parser.parse_args()
+
+    if args.redis_url:
+        # read by the settings when the app modules are imported
+        os.environ['REDIS_URL'] = args.redis_url
+
+    import redis
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from redis.commands.search.query import Query
+    from ulid import ULID
+
+    from app.backend.core.config import settings
+    from app.backend.chatbot.ChatHistory import ChatHistory, create_chat_vector_store
+    from app.backend.services.redis_pool import get_redis_pool
+
+    client = get_redis_pool().client
+    pinger = redis.Redis.from_url(settings.redis_url)
+    embeddings = DeterministicFakeEmbedding(size=args.dim)
+    store = create_chat_vector_store(embeddings, index_name=args.index)
+    session_id = 'deletion-benchmark'
+    history = ChatHistory(session_id=session_id, embeddings=embeddings, vector_store=store)
+    rng = np.random.default_rng(0)
+
+    try:
+        print(f'writing {args.background_keys} background keys and {args.messages} messages...')
+        pipe = client.pipeline(transaction=False)
+        for i in range(args.background_keys):
+            pipe.set(f'deletion-benchmark-background:{i}', i)
+            if len(pipe) >= 10000:
+                pipe.execute()
+        pipe.execute()
+
+        for i in range(args.messages):
+            key = f"{args.index}:{ULID()}"
+            pipe.hset(key, mapping={
+                'text': f'message {i}',
+                'embedding': rng.standard_normal(args.dim).astype('float32').tobytes(),
+                'sender': 'human' if i % 2 == 0 else 'ai',
+                'session_id': session_id,
+            })
+            if rng.random() >= args.untracked:
+                pipe.sadd(history.keys_key, key)
+            # the same messages under the legacy per-session key prefix, for the KEYS scan to find
+            pipe.set(f'{session_id}:{i}', i)
+            if len(pipe) >= 10000:
+                pipe.execute()
+        pipe.execute()
+        keyspace = client.dbsize()
+
+        _report('KEYS scan of the keyspace (before)', *_while_pinging(pinger, lambda: client.keys(f'{session_id}:*')))
+        _report('clear_history (after)', *_while_pinging(pinger, history.clear_history))
+
+        left = client.ft(args.index).search(Query(str(history.session_filter)).no_content().paging(0, 0)).total
+        deleted = keyspace - client.dbsize()
+        ok = left == 0 and not client.exists(history.keys_key) and deleted == args.messages + 1
+        print(f'messages left {left}, keys deleted {deleted} (expected {args.messages + 1}): {"OK" if ok else "FAILED"}')
+    finally:
+        client.ft(args.index).dropindex(delete_documents=True)
+        for pattern in ('deletion-benchmark-background:*', f'{session_id}:*'):
+            batch = []
+            for key in client.scan_iter(match=pattern, count=10000):
+                batch.append(key)
+                if len(batch) >= 10000:
+                    client.unlink(*batch)
+                    batch = []
+            if batch:
+                client.unlink(*batch)
+        client.unlink(history.keys_key)
+
+    sys.exit(0 if ok else 1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+'''
+Benchmark of the chat history retrieval from the shared chat index, filtered by session, with many sessions in it.
+
+Fills a scratch index with random message vectors of many sessions (no embedding model needed), then times the
+top-k similarity search of random sessions, as ChatHistory.retrieve does it. Needs Redis Stack:
+    python -m app.backend.benchmarks.chat_history_retrieval --sessions 10000 --messages 20
+'''
+import argparse
+import os
+import statistics
+import time
+
+import numpy as np
+
+def _percentile(values: list[float], q: float) -> float:
+    return float(np.percentile(values, q))
+
+def _wait_for_indexing(client, index_name: str, timeout: float = 600):
+    start = time.perf_counter()
+    while time.perf_counter() - start < timeout:
+        info = client.ft(index_name).info()
+        if float(info.get('percent_indexed', 1)) >= 1 and int(info.get('indexing', 0)) == 0:
+            return info
+        time.sleep(0.5)
+    raise TimeoutError(f"{index_name} is still indexing after {timeout:g} seconds")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default=None, help='defaults to settings.redis_url')
+    parser.add_argument('--index', default='chat_messages_benchmark', help='scratch index, dropped at the end')
+    parser.add_argument('--sessions', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=20, help='messages per session')
+    parser.add_argument('--dim', type=int, default=768, help='embedding size (768 for all-mpnet-base-v2)')
+    parser.add_argument('--queries', type=int, default=500)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--keep', action='store_true', help='keep the scratch index and its documents')
+    args = parser.parse_args()
+
+    if args.redis_url:
+        # read by the settings when the app modules are imported
+        os.environ['REDIS_URL'] = args.redis_url
+
+    from langchain_core.embeddings import DeterministicFakeEmbedding
+    from redisvl.query.filter import Tag
+    from ulid import ULID
+
+    from app.backend.chatbot.ChatHistory import create_chat_vector_store
+    from app.backend.services.redis_pool import get_redis_pool
+
+    client = get_redis_pool().client
+    store = create_chat_vector_store(DeterministicFakeEmbedding(size=args.dim), index_name=args.index)
+    rng = np.random.default_rng(0)
+
+    try:
+        start = time.perf_counter()
+        for session in range(args.sessions):
+            pipe = client.pipeline(transaction=False)
+            vectors = rng.standard_normal((args.messages, args.dim)).astype('float32')
+            for i, vector in enumerate(vectors):
+                pipe.hset(f"{args.index}:{ULID()}", mapping={
+                    'text': f'message {i} of session {session}',
+                    'embedding': vector.tobytes(),
+                    'sender': 'human' if i % 2 == 0 else 'ai',
+                    'session_id': str(session),
+                })
+            pipe.execute()
+        info = _wait_for_indexing(client, args.index)
+        print(f'loaded {args.sessions * args.messages} messages of {args.sessions} sessions in {time.perf_counter() - start:.1f} s')
+        print(f"index: {info.get('num_docs')} docs, vectors {float(info.get('vector_index_sz_mb', 0)):.1f} MB, "
+              f"inverted index {float(info.get('inverted_sz_mb', 0)):.1f} MB")
+
+        timings = []
+        for _ in range(args.queries):
+            session = str(rng.integers(args.sessions))
+            query = rng.standard_normal(args.dim).astype('float32').tolist()
+            start = time.perf_counter()
+            docs = store.similarity_search_by_vector(query, k=args.k, filter=Tag("session_id") == session)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert all(doc.metadata.get('session_id', session) == session for doc in docs)
+
+        print(f'top-{args.k} retrieval of one session, ms over {args.queries} queries:')
+        print(f'mean {statistics.mean(timings):.2f}  p50 {_percentile(timings, 50):.2f}  '
+              f'p95 {_percentile(timings, 95):.2f}  p99 {_percentile(timings, 99):.2f}')
+    finally:
+        if not args.keep:
+            client.ft(args.index).dropindex(delete_documents=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+'''
+Benchmark of the embedding backends (see app/backend/chatbot/embedding_backends.py) on chat transcripts.
+
+For every backend: the load time, the throughput of embedding all the messages in batches (as the persistence queue
+does), the latency of embedding one query (as a chat retrieval does), and the retrieval quality against the full
+model: for every user message, the other messages of its transcript are ranked by similarity, and the top-k of the
+backend is compared with the top-k of the full model. No cache and no Redis, the models are timed on their own:
+    python -m app.backend.benchmarks.embedding_backends --backends full int8 small
+
+The transcripts are a JSON file of conversations, each a list of messages alternating user and assistant, e.g. exported
+from the chat history endpoint; a small built-in sample is used without it.
+'''
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+SAMPLE_TRANSCRIPTS = [
+    [
+        "What is a price to earnings ratio and how should I use it?",
+        "The P/E ratio divides the share price by the earnings per share. A high P/E means investors pay more for every "
+        "dollar of earnings, usually because they expect growth. Compare it with peers of the same industry.",
+        "Is Apple expensive compared to Microsoft on that basis?",
+        "Apple trades at about 30 times earnings and Microsoft at about 35, so Apple is slightly cheaper on earnings, "
+        "although Microsoft has grown its earnings faster over the last three years.",
+        "What about their free cash flow?",
+        "Both generate large free cash flows. Apple's is higher in absolute terms, Microsoft's free cash flow margin is higher.",
+        "Which one pays the better dividend?",
+        "Microsoft has the higher dividend yield, while Apple returns more cash through share buybacks.",
+    ],
+    [
+        "How do bonds react when interest rates go up?",
+        "Bond prices fall when rates rise, since new bonds pay higher coupons. Longer durations fall more.",
+        "Should I buy a bond ETF or individual treasuries?",
+        "A bond ETF gives diversification and liquidity but never matures; individual treasuries return their face value at maturity.",
+        "What is duration exactly?",
+        "Duration measures the sensitivity of a bond's price to interest rates, roughly the percentage change for a one point move.",
+        "Are inflation protected bonds worth it now?",
+        "TIPS adjust their principal with inflation, so they protect real returns when inflation turns out higher than expected.",
+    ],
+    [
+        "What's the latest news on Nvidia earnings?",
+        "Nvidia beat revenue estimates, driven by data center demand for its GPUs, and raised its guidance for next quarter.",
+        "How much of its revenue comes from data centers?",
+        "Data centers account for the large majority of Nvidia's revenue, far ahead of gaming.",
+        "Is the stock overvalued after the rally?",
+        "Its forward P/E is high but lower than a year ago, since earnings grew faster than the share price.",
+        "What are the main risks?",
+        "Export restrictions to China, customers designing their own chips, and a slowdown of AI spending.",
+    ],
+]
+
+def _normalized(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype='float32')
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+def _rankings(vectors: np.ndarray, transcripts: list[list[str]], k: int) -> list[list[int]]:
+    '''The top-k other messages of its transcript for every user message, by cosine similarity.'''
+    rankings, offset = [], 0
+    for transcript in transcripts:
+        block = vectors[offset:offset + len(transcript)]
+        # user messages are the even ones
+        for i in range(0, len(transcript), 2):
+            scores = block @ block[i]
+            scores[i] = -np.inf
+            rankings.append([int(j) for j in np.argsort(-scores)[:k]])
+        offset += len(transcript)
+    return rankings
+
+def _agreement(rankings: list[list[int]], baseline: list[list[int]]) -> tuple[float, float]:
+    '''The mean overlap of the top-k with the baseline, and how often the top-1 is the same.'''
+    overlap = statistics.mean(len(set(a) & set(b)) / len(b) for a, b in zip(rankings, baseline))
+    top1 = statistics.mean(a[0] == b[0] for a, b in zip(rankings, baseline))
+    return overlap, top1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backends', nargs='+', default=['full', 'int8', 'small'])
+    parser.add_argument('--transcripts', default=None, help='JSON file of conversations (lists of messages)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs of the batch embedding, the fastest is kept')
+    parser.add_argument('--queries', type=int, default=50, help='single queries timed per backend')
+    parser.add_argument('--k', type=int, default=3)
+    args = parser.parse_args()
+
+    from app.backend.chatbot.embedding_backends import create_embeddings
+
+    if args.transcripts:
+        with open(args.transcripts, encoding='utf-8') as f:
+            transcripts = json.load(f)
+    else:
+        transcripts = SAMPLE_TRANSCRIPTS
+    texts = [message for transcript in transcripts for message in transcript]
+    queries = [texts[i % len(texts)] for i in range(args.queries)]
+    print(f'{len(texts)} messages in {len(transcripts)} transcripts\n')
+
+    baseline = None
+    rows = []
+    # the full model is the reference of the retrieval quality, so it is always run first
+    for backend in ['full'] + [backend for backend in args.backends if backend != 'full']:
+        start = time.perf_counter()
+        embeddings = create_embeddings(backend)
+        load = time.perf_counter() - start
+        # warm up, the first forward pass is slower
+        embeddings.embed_documents(texts[:8])
+
+        durations = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            vectors = embeddings.embed_documents(texts)
+            durations.append(time.perf_counter() - start)
+
+        latencies = []
+        for query in queries:
+            start = time.perf_counter()
+            embeddings.embed_query(query)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+        vectors = _normalized(vectors)
+        rankings = _rankings(vectors, transcripts, args.k)
+        if baseline is None:
+            baseline = {'vectors': vectors, 'rankings': rankings, 'throughput': len(texts) / min(durations)}
+        overlap, top1 = _agreement(rankings, baseline['rankings'])
+        # vectors of the same size (the same model) can also be compared directly
+        cosine = float(np.mean(np.sum(vectors * baseline['vectors'], axis=1))) if vectors.shape == baseline['vectors'].shape else None
+
+        rows.append((backend, load, len(texts) / min(durations), np.percentile(latencies, 50), np.percentile(latencies, 95), vectors.shape[1], overlap, top1, cosine))
+        if backend not in args.backends:
+            # only run as the reference
+            rows.pop()
+        del embeddings
+
+    print(f"{'backend':<8} {'load s':>7} {'texts/s':>9} {'speedup':>8} {'query p50 ms':>13} {'p95 ms':>8} {'dim':>5} "
+          f"{f'top-{args.k} overlap':>14} {'top-1 same':>11} {'cosine to full':>15}")
+    for backend, load, throughput, p50, p95, dim, overlap, top1, cosine in rows:
+        print(f"{backend:<8} {load:>7.1f} {throughput:>9.1f} {throughput / baseline['throughput']:>7.2f}x {p50:>13.1f} {p95:>8.1f} {dim:>5} "
+              f"{overlap:>14.2%} {top1:>11.2%} {'-' if cosine is None else f'{cosine:.4f}':>15}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+'''
+Microbenchmark of the vectorized ratio engine against the per-metric zip loops it replaced.
+
+Run with: python -m app.backend.benchmarks.ratio_engine --tickers 500 --years 4
+'''
+import argparse
+import timeit
+
+import pandas as pd
+import numpy as np
+
+from app.backend.chatbot.ratio_engine import compute_ratios, BALANCE_SHEET_ITEMS, INCOME_STATEMENT_ITEMS
+
+def make_statements(num_tickers: int, num_years: int, nan_fraction: float = 0.05, seed: int = 0) -> dict:
+    '''
+    Build random statements shaped like the ones returned by yfinance (one row per fiscal date).
+
+    Args:
+        num_tickers (int): The number of companies
+        num_years (int): The number of fiscal years per company
+        nan_fraction (float): The fraction of values that are missing
+        seed (int): The random seed
+
+    Returns:
+        dict: ticker -> (balance sheet, income statement)
+    '''
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end='2024-12-31', periods=num_years, freq='YE').strftime('%Y-%m-%d')
+
+    def statement(items):
+        values = rng.uniform(1e6, 1e9, size=(num_years, len(items)))
+        values[rng.random(values.shape) < nan_fraction] = np.nan
+        return pd.DataFrame(values, index=dates, columns=items)
+
+    return {
+        f'T{i:04d}': (statement(BALANCE_SHEET_ITEMS), statement(INCOME_STATEMENT_ITEMS))
+        for i in range(num_tickers)
+    }
+
+def _legacy_ratio(numerator: dict, denominator: dict, op) -> dict:
+    # the loop every metric function used to run on the dictionaries of the statements
+    res = {}
+    for date, a, b in zip(numerator.keys(), numerator.values(), denominator.values()):
+        if np.isnan(a) or np.isnan(b):
+            continue
+        res[date] = round(op(a, b), 2)
+    return res
+
+def legacy_ratios(balance_sheet: pd.DataFrame, income_statement: pd.DataFrame) -> dict:
+    '''Compute the ratios the way the agent tools did before the ratio engine, one dictionary per metric.'''
+    divide = lambda a, b: a / b
+    res = {}
+
+    # every metric function converted the statements to dictionaries again
+    bs, inc = balance_sheet.to_dict(), income_statement.to_dict()
+    graham_numbers = {}
+    for date, eps, book_value, shares in zip(inc['Diluted EPS'].keys(), inc['Diluted EPS'].values(), bs['Stockholders Equity'].values(), bs['Ordinary Shares Number'].values()):
+        if np.isnan(eps) or np.isnan(book_value) or np.isnan(shares):
+            continue
+        graham_numbers[date] = round((22.5 * eps * book_value / shares) ** 0.5, 2)
+    res['graham_number'] = graham_numbers
+
+    for name, statement_a, a, statement_b, b, op in [
+        ('roe', 'inc', 'Net Income', 'bs', 'Stockholders Equity', divide),
+        ('roa', 'inc', 'Net Income', 'bs', 'Total Assets', divide),
+        ('debt_to_equity_ratio', 'bs', 'Total Debt', 'bs', 'Common Stock Equity', divide),
+        ('debt_to_asset_ratio', 'bs', 'Total Debt', 'bs', 'Total Assets', divide),
+        ('gross_profit_margin', 'inc', 'Gross Profit', 'inc', 'Total Revenue', divide),
+        ('operating_margin', 'inc', 'EBIT', 'inc', 'Total Revenue', divide),
+        ('net_profit_margin', 'inc', 'Net Income', 'inc', 'Total Revenue', divide),
+        ('current_ratio', 'bs', 'Current Assets', 'bs', 'Current Debt', divide),
+        ('working_capital', 'bs', 'Current Assets', 'bs', 'Current Debt', lambda a, b: a - b),
+    ]:
+        bs, inc = balance_sheet.to_dict(), income_statement.to_dict()
+        statements = {'bs': bs, 'inc': inc}
+        res[name] = _legacy_ratio(statements[statement_a][a], statements[statement_b][b], op)
+
+    return res
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tickers', type=int, default=500)
+    parser.add_argument('--years', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    statements = make_statements(args.tickers, args.years)
+    stacked_balance_sheet = pd.concat({ticker: bs for ticker, (bs, _) in statements.items()})
+    stacked_income_statement = pd.concat({ticker: inc for ticker, (_, inc) in statements.items()})
+
+    timings = {
+        'legacy zip loops (per ticker)': lambda: [legacy_ratios(bs, inc) for bs, inc in statements.values()],
+        'ratio engine (per ticker)': lambda: [compute_ratios(bs, inc) for bs, inc in statements.values()],
+        'ratio engine (all tickers stacked)': lambda: compute_ratios(stacked_balance_sheet, stacked_income_statement),
+    }
+
+    print(f'{args.tickers} tickers x {args.years} fiscal years, best of {args.repeat}')
+    baseline = None
+    for name, fn in timings.items():
+        best = min(timeit.repeat(fn, number=1, repeat=args.repeat))
+        baseline = baseline or best
+        print(f'{name:<40} {best * 1000:>10.2f} ms {baseline / best:>8.1f}x')
+
+if __name__ == '__main__':
+    main()
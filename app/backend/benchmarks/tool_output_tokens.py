@@ -0,0 +1,75 @@
+'''
+Size of the get_financial_information output in the LLM context: the JSON of the raw dictionaries against the compact table.
+
+Against recorded market data (see app.backend.benchmarks.agent_tools to record it):
+    python -m app.backend.benchmarks.tool_output_tokens AAPL MSFT KO
+
+Add --live to count the tokens with the Gemini tokenizer and measure the time to first token of the AnalysisAgent
+model with each output in its prompt (needs GOOGLE_API_KEY and the network).
+'''
+import argparse
+import json
+import shutil
+import statistics
+import time
+
+from app.backend.benchmarks.agent_tools import use_scratch_stores
+
+def _time_to_first_token(chat, system_prompt: str, tool_output: str) -> float:
+    '''Time until the first token of an answer that has the tool output in its prompt.'''
+    start = time.perf_counter()
+    for _ in chat.stream([
+        ('system', system_prompt),
+        ('human', f'Here is the financial information of the company:\n{tool_output}\n\nIs it a good long-term investment?'),
+    ]):
+        return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('tickers', nargs='+')
+    parser.add_argument('--fixtures', default=None, help='directory of the recorded market data, defaults to settings.market_data_fixtures_dir')
+    parser.add_argument('--precision', type=int, default=None, help='decimals of the table, defaults to settings.tool_output_precision')
+    parser.add_argument('--live', action='store_true')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per output when measuring the time to first token')
+    args = parser.parse_args()
+
+    scratch = use_scratch_stores()
+    try:
+        from app.backend.core.config import settings
+        from app.backend.services.market_data_provider import ReplayProvider, set_market_data_provider
+        from app.backend.chatbot.agent_tools import financial_information
+        from app.backend.chatbot.tool_formatting import financial_information_table
+
+        set_market_data_provider(ReplayProvider(args.fixtures or settings.market_data_fixtures_dir))
+        precision = args.precision if args.precision is not None else settings.tool_output_precision
+
+        chat = system_prompt = None
+        if args.live:
+            from langchain_google_genai import ChatGoogleGenerativeAI
+            from app.backend.chatbot.AnalysisAgent import AnalysisAgent
+
+            chat = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0.5, max_retries=3)
+            system_prompt = AnalysisAgent.prompt_template
+
+        print(f'{"":<20} {"chars":>8} {"tokens":>8} {"ttft ms":>8}')
+        for ticker in args.tickers:
+            info = financial_information(ticker)
+            outputs = {
+                'json (before)': json.dumps(info),
+                'table (after)': financial_information_table(info, precision),
+            }
+
+            print(f'--- {ticker}')
+            for name, output in outputs.items():
+                if chat is None:
+                    # rough estimate of about 4 characters per token
+                    tokens, ttft = f'~{len(output) // 4}', ''
+                else:
+                    tokens = str(chat.get_num_tokens(output))
+                    ttft = f'{statistics.median(_time_to_first_token(chat, system_prompt, output) for _ in range(args.repeat)) * 1000:.0f}'
+                print(f'{name:<20} {len(output):>8} {tokens:>8} {ttft:>8}')
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+if __name__ == '__main__':
+    main()
@@ -7,7 +7,7 @@ from typing import List, Union
 
 from .BaseChatBot import BaseChatBot
 
-from .agent_tools import get_financial_information
+from .agent_tools import get_financial_information, compare_financial_information, screen_stocks, get_dcf_sensitivity
 
 # Bot that helps to perform financial analysis of a company stock
 class AnalysisAgent(BaseChatBot):
@@ -17,6 +17,9 @@ class AnalysisAgent(BaseChatBot):
     Your analysis should be balanced and comprehensive, but not limited to any single metric.
 
     You have access to a tool that helps you get financial information about the company. You must use it.
+    When asked to compare several companies, use the tool that gets the financial information of all of them at once.
+    When asked to find or rank companies matching some criteria, use the stock screener tool.
+    When asked how the valuation changes under other assumptions (discount rate, growth, horizon), use the DCF sensitivity tool.
 
     Your investment analysis should consider the following:
         - Intrinsic value: Estimate whether a stock is undervalued based on discounted cash flows, earnings power, or other reasonable valuation techniques.
@@ -54,7 +57,7 @@ class AnalysisAgent(BaseChatBot):
 
     def __init__(self):
         super().__init__()
-        self.tools = [get_financial_information]
+        self.tools = [get_financial_information, compare_financial_information, screen_stocks, get_dcf_sensitivity]
         self.bot = self._init_bot()
 
     def _init_bot(self):
@@ -0,0 +1,134 @@
+import hashlib
+import logging
+
+from threading import Lock
+
+import numpy as np
+
+from cachetools import LRUCache
+from langchain_core.embeddings import Embeddings
+
+from app.backend.core.config import settings
+from app.backend.services.redis_pool import get_redis_pool
+
+logger = logging.getLogger(__name__)
+
+# embedding model wrapper that never embeds the same text twice: vectors are cached by content hash,
+# in process first and then in Redis (shared by the workers and kept across restarts)
+class CachedEmbeddings(Embeddings):
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        namespace: str,
+        max_size: int = settings.embedding_cache_size,
+        ttl_seconds: int = settings.embedding_cache_ttl_seconds
+    ):
+        '''
+        Args:
+            embeddings (Embeddings): The embedding model
+            namespace (str): The name of the model, so that the vectors of different models never mix in Redis
+            max_size (int): The number of vectors kept in process
+            ttl_seconds (int): How long the vectors are kept in Redis
+        '''
+        self.embeddings = embeddings
+        self.namespace = namespace
+        self.ttl_seconds = ttl_seconds
+        self.cache = LRUCache(maxsize=max_size)
+        self.lock = Lock()
+        self.counts = {
+            'memory_hits': 0,
+            'redis_hits': 0,
+            'misses': 0,
+        }
+
+    def _key(self, text: str) -> str:
+        return f"embedding:{self.namespace}:{hashlib.sha256(text.encode('utf-8')).hexdigest()}"
+
+    def _count(self, name: str, n: int = 1):
+        with self.lock:
+            self.counts[name] += n
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        '''
+        Embed texts, only computing the ones not cached, in one batch.
+
+        Args:
+            texts (list[str]): The texts to embed
+
+        Returns:
+            list[list[float]]: The vector of every text
+        '''
+        keys = [self._key(text) for text in texts]
+        vectors = [None] * len(texts)
+
+        with self.lock:
+            for i, key in enumerate(keys):
+                vectors[i] = self.cache.get(key)
+        memory_hits = sum(vector is not None for vector in vectors)
+        self._count('memory_hits', memory_hits)
+
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing = self._from_redis(keys, vectors, missing)
+
+        if missing:
+            self._count('misses', len(missing))
+            # the same text may appear more than once in a batch, embed it once
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique, self.embeddings.embed_documents(unique)))
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+            self._store({keys[i]: vectors[i] for i in missing})
+
+        return [list(vector) for vector in vectors]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    def _from_redis(self, keys: list[str], vectors: list, missing: list[int]) -> list[int]:
+        '''Fill the vectors found in Redis, and return the ones still missing.'''
+        try:
+            found = get_redis_pool().client.mget([keys[i] for i in missing])
+        except Exception:
+            # the cache is an optimization, the model is still there when Redis is not
+            logger.warning("Could not read the embedding cache", exc_info=True)
+            return missing
+
+        still_missing = []
+        for i, value in zip(missing, found):
+            if value is None:
+                still_missing.append(i)
+                continue
+            vectors[i] = np.frombuffer(value, dtype='float32').tolist()
+            with self.lock:
+                self.cache[keys[i]] = vectors[i]
+        self._count('redis_hits', len(missing) - len(still_missing))
+        return still_missing
+
+    def _store(self, vectors: dict[str, list[float]]):
+        with self.lock:
+            self.cache.update(vectors)
+        try:
+            pipe = get_redis_pool().client.pipeline(transaction=False)
+            for key, vector in vectors.items():
+                pipe.set(key, np.asarray(vector, dtype='float32').tobytes(), ex=self.ttl_seconds)
+            pipe.execute()
+        except Exception:
+            logger.warning("Could not write the embedding cache", exc_info=True)
+
+    def stats(self) -> dict:
+        '''
+        Get the hit rates of the cache.
+
+        Returns:
+            dict: The hits in memory and in Redis, the misses (texts embedded), the hit rate, and the vectors kept in memory
+        '''
+        with self.lock:
+            counts = dict(self.counts)
+            size = len(self.cache)
+        total = sum(counts.values())
+        return {
+            **counts,
+            'hit_rate': round((counts['memory_hits'] + counts['redis_hits']) / total, 4) if total else None,
+            'memory_size': size,
+        }
@@ -1,67 +1,289 @@
+from langchain_core.embeddings import Embeddings
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_huggingface import HuggingFaceEmbeddings
 from langchain_redis import RedisConfig, RedisVectorStore
 from langchain_redis.chat_message_history import RedisChatMessageHistory
+from redis.commands.search.query import Query
+from redisvl.index import AsyncSearchIndex
+from redisvl.query import VectorQuery
+from redisvl.query.filter import Tag
 
 import redis
 
 import asyncio
+import hashlib
+import json
+import time
+
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property, lru_cache
+
+from ulid import ULID
 
 from app.backend.core.config import settings
+from app.backend.services.redis_pool import get_redis_pool
+from app.backend.services.persistence_queue import get_persistence_queue
+from app.backend.chatbot.history_compaction import compact_history, summarize
 
 # NOTE: before this, run the following: docker run -d -p 6379:6379 -p 8001:8001 redis/redis-stack:latest
 
+# number of keys read and unlinked at a time when deleting the messages of a session, so that Redis is never blocked for long
+DELETE_BATCH_SIZE = 1000
+
+# prefix of the sets of the document keys of every session in the vector store
+SESSION_KEYS_PREFIX = "chat_session_keys"
+
+# prefix of the lists of the messages of every session as displayed, oldest first, read by range for pagination
+DISPLAY_LOG_PREFIX = "chat_display"
+
+# blocking work of the async retrieval (embedding the query on CPU, reading the stored history), off the event loop
+_history_executor = ThreadPoolExecutor(max_workers=settings.history_executor_max_workers, thread_name_prefix='chat-history')
+
+def create_chat_vector_store(embeddings: Embeddings, index_name: str = settings.chat_index_name) -> RedisVectorStore:
+    '''
+    Create the Redis vector store shared by all sessions: one index, with the session of every message as a tag.
+
+    Args:
+        embeddings (Embeddings): The embedding model of the messages
+        index_name (str): The name of the index, also the prefix of the keys of the messages
+
+    Returns:
+        RedisVectorStore: The vector store
+    '''
+    config = RedisConfig(
+        index_name=index_name,
+        redis_url=settings.redis_url,
+        redis_client=get_redis_pool().client,
+        metadata_schema=[
+            {
+                "name": "sender",
+                "type": "tag"
+            },
+            {
+                "name": "session_id",
+                "type": "tag"
+            }
+        ]
+    )
+    return RedisVectorStore(
+        config=config,
+        embeddings=embeddings
+    )
+
+@lru_cache(maxsize=1)
+def _async_index(vector_store: RedisVectorStore) -> AsyncSearchIndex:
+    # async handle on the index of the shared vector store, built once and used by all sessions
+    return AsyncSearchIndex(vector_store.index.schema, redis_client=get_redis_pool().async_client)
+
 # chat history class that uses Redis as a vector store
 class ChatHistory:
-    def __init__(self, session_id: str, embeddings: HuggingFaceEmbeddings):
+    def __init__(self, session_id: str, embeddings: Embeddings, vector_store: RedisVectorStore):
         self.session_id = session_id
+        self.embeddings = embeddings
+        # Redis vector store as chat history for LLM to retrieve messages from, shared by all sessions
+        self.vector_store = vector_store
+        # the message history below is only built when first used, so creating a session costs nothing
+        # whether the session has messages older than the recent ones, which only the vector store can recall
+        self.has_older = False
 
-        # initalize Redis client
-        self.redis_client = redis.Redis(host='localhost', port=6379, db=0)
-        self.config = RedisConfig(
-            index_name=self.session_id,
-            redis_url=settings.redis_url,
-            metadata_schema=[
-                {
-                    "name": "sender",
-                    "type": "tag"
-                }
-            ]
-        )
-        # initialize Redis vector store as chat history for LLM to retrieve messages from
-        self.vector_store = RedisVectorStore(
-            config=self.config,
-            embeddings=embeddings
-        )
+    @property
+    def redis_client(self) -> redis.Redis:
+        # shared by all sessions, so that the number of connections is bounded by the pool and not by the sessions
+        return get_redis_pool().client
+
+    @property
+    def keys_key(self) -> str:
+        # set of the keys of the documents of this session in the vector store, to delete them without scanning the keyspace
+        return f"{SESSION_KEYS_PREFIX}:{self.session_id}"
 
-        # initialize the chat message history for persistence and frontend display
-        self.chat_message_history = RedisChatMessageHistory(
+    @property
+    def display_key(self) -> str:
+        return f"{DISPLAY_LOG_PREFIX}:{self.session_id}"
+
+    @property
+    def session_filter(self) -> Tag:
+        # only the messages of this session in the shared index
+        return Tag("session_id") == self.session_id
+
+    @cached_property
+    def chat_message_history(self) -> RedisChatMessageHistory:
+        # chat message history of the sessions from before the display log, only read to backfill it (no longer written)
+        return RedisChatMessageHistory(
             session_id=self.session_id,
             redis_url=settings.redis_url,
             redis_client=self.redis_client
         )
 
+    @cached_property
+    def recent_messages(self) -> deque:
+        # ring buffer of the latest turns of the session, read from the display log once when the session becomes active
+        recent = deque(maxlen=settings.recent_turns * 2)
+        if not self.redis_client.exists(self.display_key):
+            self._backfill_display_log()
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.llen(self.display_key)
+        if recent.maxlen:
+            pipe.lrange(self.display_key, -recent.maxlen, -1)
+        length, *entries = pipe.execute()
+
+        recent.extend(self._to_message(json.loads(entry)) for entry in (entries[0] if entries else []))
+        self.has_older = length > recent.maxlen
+        return recent
+
+    def _backfill_display_log(self):
+        # sessions from before the display log: copy their whole stored history into it, once. The copy is built
+        # under a key of its own and moved into place only if no other worker or request did it first
+        messages = self.chat_message_history.messages
+        if messages:
+            scratch = f"{self.display_key}:backfill:{ULID()}"
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.rpush(scratch, *[self._to_entry(message, None) for message in messages])
+            pipe.renamenx(scratch, self.display_key)
+            pipe.unlink(scratch)
+            pipe.execute()
+
+    @staticmethod
+    def _to_entry(message: HumanMessage | AIMessage, timestamp: float | None) -> str:
+        return json.dumps({
+            "role": "user" if isinstance(message, HumanMessage) else "assistant",
+            "content": message.content,
+            "timestamp": timestamp
+        })
+
+    @staticmethod
+    def _to_message(entry: dict) -> HumanMessage | AIMessage:
+        return HumanMessage(content=entry["content"]) if entry["role"] == "user" else AIMessage(content=entry["content"])
+
+    async def _activate(self):
+        if 'recent_messages' not in self.__dict__:
+            # the first read of the stored history is blocking
+            await asyncio.get_running_loop().run_in_executor(_history_executor, lambda: self.recent_messages)
+
+    async def history_version(self) -> str:
+        '''
+        Get a version of the displayed history, which changes whenever a message is added or the history is cleared.
+
+        Returns:
+            str: The number of messages and a hash of the latest one
+        '''
+        await self._activate()
+        pipe = get_redis_pool().async_client.pipeline(transaction=False)
+        pipe.llen(self.display_key)
+        pipe.lindex(self.display_key, -1)
+        length, latest = await pipe.execute()
+        return f"{length}-{hashlib.sha1(latest or b'').hexdigest()[:12]}"
+
+    async def history_page(self, cursor: int | None = None, limit: int = settings.chat_history_page_size) -> dict:
+        '''
+        Get a page of the displayed history, pages going from the newest messages to the oldest.
+
+        Args:
+            cursor (int): The cursor returned with the previous (newer) page, or None for the newest page
+            limit (int): The maximum number of messages of the page
+
+        Returns:
+            dict: The messages of the page (oldest first, each with its role, content and timestamp),
+                and the cursor of the next (older) page, None if there are no older messages
+        '''
+        await self._activate()
+        client = get_redis_pool().async_client
+        # the cursor is the position of the oldest message of the previous page, positions never change since the log is only appended to
+        length = await client.llen(self.display_key)
+        end = length if cursor is None else min(cursor, length)
+        start = max(end - limit, 0)
+        entries = await client.lrange(self.display_key, start, end - 1) if end > start else []
+
+        return {
+            "messages": [json.loads(entry) for entry in entries],
+            "next_cursor": start if start > 0 else None
+        }
+
     def clear_history(self):
         """Clear the chat history for the session."""
-        # clear chat message history
+        # forget the buffer, it is read again (empty) on the next turn
+        self.__dict__.pop('recent_messages', None)
+        self.has_older = False
+        self.redis_client.unlink(self.display_key)
+
+        # clear the chat message history left by a session from before the display log
         self.chat_message_history.clear()
         
-        # clear vector store documents
-        keys = self.redis_client.keys(f"{self.session_id}:*")
-        if keys:
-            self.redis_client.delete(*keys)
+        # clear vector store documents: the keys tracked for the session, unlinked (freed in the background) in batches
+        batch = []
+        for key in self.redis_client.sscan_iter(self.keys_key, count=DELETE_BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= DELETE_BATCH_SIZE:
+                self._unlink_tracked(batch)
+                batch = []
+        if batch:
+            self._unlink_tracked(batch)
+        self.redis_client.unlink(self.keys_key)
+
+        # documents whose keys were not tracked (e.g. written before the tracking, or migrated) are found through the session tag
+        search = self.redis_client.ft(self.vector_store.config.index_name)
+        while True:
+            docs = search.search(Query(str(self.session_filter)).no_content().paging(0, DELETE_BATCH_SIZE)).docs
+            if not docs:
+                break
+            self.redis_client.unlink(*[doc.id for doc in docs])
+
+    def _unlink_tracked(self, keys: list):
+        # forget the keys as they are deleted, so that an interrupted clear resumes where it stopped
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.unlink(*keys)
+        pipe.srem(self.keys_key, *keys)
+        pipe.execute()
 
     def retrieve(self, query: str, num_messages: int=5):
-        """Retrieve the last `num_messages` messages from the chat history."""
-        history_retriever = self.vector_store.as_retriever(search_type="similarity", search_kwargs={"k": num_messages}) # return 5 by default
-        history = history_retriever.invoke(query)
+        """Retrieve the recent turns of the chat history, after up to `num_messages` older messages relevant to the query, compacted to the history token budget."""
+        recent = list(self.recent_messages)
+        if not self.has_older:
+            # the whole conversation is in the buffer, no need to search
+            return compact_history(recent)
 
-        # to distinguish between human and AI messages, we added the metadata field 'sender'
-        history = [
-            HumanMessage(content=doc.page_content) if doc.metadata['sender'] == 'human' else AIMessage(content=doc.page_content) for doc in history
-        ]
+        # the same query as the async version, since the retriever of langchain-redis does not return the stored summaries
+        vector = self.embeddings.embed_query(query)
+        results = self.vector_store.index.query(self._history_query(vector, num_messages + len(recent)))
+        return compact_history(self._older_messages(self._found(results), recent, num_messages) + recent)
+
+    async def aretrieve(self, query: str, num_messages: int=5):
+        """Async version of `retrieve`: the query is embedded in a worker thread and the vector search is an async Redis query."""
+        loop = asyncio.get_running_loop()
+        await self._activate()
 
-        return history
+        recent = list(self.recent_messages)
+        if not self.has_older:
+            # the whole conversation is in the buffer, no need to search
+            return compact_history(recent)
+
+        vector = await loop.run_in_executor(_history_executor, self.embeddings.embed_query, query)
+        results = await _async_index(self.vector_store).query(self._history_query(vector, num_messages + len(recent)))
+        return compact_history(self._older_messages(self._found(results), recent, num_messages) + recent)
+
+    def _history_query(self, vector: list[float], num_results: int) -> VectorQuery:
+        # ask for more than needed, since the most similar messages are often the recent ones already in the buffer
+        config = self.vector_store.config
+        return VectorQuery(
+            vector=vector,
+            vector_field_name=config.embedding_field,
+            return_fields=[config.content_field, "sender", "summary"],
+            filter_expression=self.session_filter,
+            num_results=num_results,
+        )
+
+    def _found(self, results: list[dict]) -> list[tuple[str, str, str | None]]:
+        content_field = self.vector_store.config.content_field
+        return [(result[content_field], result['sender'], result.get('summary')) for result in results]
+
+    def _older_messages(self, found: list[tuple[str, str, str | None]], recent: list, num_messages: int) -> list:
+        '''Turn the (content, sender, summary) found by a vector search into messages, leaving out the ones already in the buffer.'''
+        # to distinguish between human and AI messages, we added the metadata field 'sender'
+        recent_contents = {message.content for message in recent}
+        return [
+            HumanMessage(content=content) if sender == 'human' else AIMessage(content=content, additional_kwargs={'summary': summary} if summary else {})
+            for content, sender, summary in found if content not in recent_contents
+        ][:num_messages]
     
     async def add_messages(self, messages: list[str], metadata: list[dict[str, str]]):
 
@@ -70,7 +292,23 @@ class ChatHistory:
             HumanMessage(content=message) if meta['sender'] == 'human' else AIMessage(content=message)
             for message, meta in zip(messages, metadata)
         ]
-        asyncio.create_task(self.chat_message_history.aadd_messages(history_messages))
-        
-        # add to chat history vector store
-        asyncio.create_task(self.vector_store.aadd_texts(messages, metadata))
\ No newline at end of file
+
+        # long AI answers are stored with a short summary, which stands for them in the history once they are older
+        metadata = [dict(meta) for meta in metadata]
+        for message, meta in zip(history_messages, metadata):
+            summary = summarize(message.content) if isinstance(message, AIMessage) else message.content
+            if summary != message.content:
+                message.additional_kwargs['summary'] = meta['summary'] = summary
+
+        # the next turn gets them from the buffer right away, Redis is written behind
+        if len(self.recent_messages) + len(history_messages) > self.recent_messages.maxlen:
+            self.has_older = True
+        self.recent_messages.extend(history_messages)
+
+        # the display log is appended to right away, so that the turns are in order
+        now = time.time()
+        await get_redis_pool().async_client.rpush(self.display_key, *[self._to_entry(message, now) for message in history_messages])
+
+        # the vector store (tagged with the session) is written behind, in batches across sessions
+        metadata = [{**meta, "session_id": self.session_id} for meta in metadata]
+        await get_persistence_queue().put(self, history_messages, metadata)
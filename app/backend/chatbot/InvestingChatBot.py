@@ -21,7 +21,7 @@ class InvestingChatBot:
         intent = self.intent_parser.prompt({"input": message})
 
         # get chat history
-        history = chat_history.retrieve(message)
+        history = await chat_history.aretrieve(message)
 
         # decide which chatbot to use based on the intent
         chatbot = None
@@ -3,13 +3,12 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_groq import ChatGroq
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.messages import HumanMessage, AIMessage
-from langchain_tavily import TavilySearch
 
 from typing import List, Union
 
 from .BaseChatBot import BaseChatBot
 
-from .agent_tools import get_webpage_content
+from .agent_tools import search_news
 
 # SearchAgent class that searches for financial news articles and analyzes their sentiment
 class SearchAgent(BaseChatBot):
@@ -26,13 +25,7 @@ class SearchAgent(BaseChatBot):
     def __init__(self):
         super().__init__()
         self.tools = [
-            TavilySearch(
-                api_key="TAVILY_API_KEY",
-                search_type="news",
-                language="en",
-                max_results=5,
-                sort_by="relevancy",
-            )
+            search_news
         ]
         self.bot = self._init_bot()
 
@@ -0,0 +1,86 @@
+from functools import cached_property
+from threading import Lock
+
+from cachetools import TTLCache
+
+import pandas as pd
+
+from app.backend.core.config import settings
+from app.backend.database.fundamentals_store import fundamentals_store
+from app.backend.database.price_store import price_store
+from app.backend.services.market_data_provider import get_market_data_provider
+
+from .ratio_engine import compute_ratios
+
+# snapshot of everything the agent tools need to know about a ticker, so that one tool call
+# only loads each dataset once instead of once per metric (statements and prices come from the local stores)
+class TickerSnapshot:
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+
+    @cached_property
+    def balance_sheet(self) -> pd.DataFrame:
+        '''The annual balance sheet, indexed by fiscal date.'''
+        return fundamentals_store.get_statement(self.ticker, 'balance_sheet')
+
+    @cached_property
+    def income_statement(self) -> pd.DataFrame:
+        '''The annual income statement, indexed by fiscal date.'''
+        return fundamentals_store.get_statement(self.ticker, 'income_statement')
+
+    @cached_property
+    def cash_flow(self) -> pd.DataFrame:
+        '''The annual cash flow statement, indexed by fiscal date.'''
+        return fundamentals_store.get_statement(self.ticker, 'cash_flow')
+
+    @cached_property
+    def info(self) -> dict:
+        '''The company profile and key statistics.'''
+        return get_market_data_provider().get_info(self.ticker)
+
+    @cached_property
+    def price_history(self) -> pd.DataFrame:
+        '''The full daily price history of the stock.'''
+        return price_store.get_history(self.ticker)
+
+    @cached_property
+    def year_end_close(self) -> pd.Series:
+        '''The last close of every calendar year, with year as index.'''
+        return price_store.get_year_end_close(self.ticker)
+
+    @cached_property
+    def latest_close(self) -> float:
+        '''The latest close of the stock.'''
+        return price_store.get_latest_close(self.ticker)
+
+    @cached_property
+    def ratios(self) -> pd.DataFrame:
+        '''All the statement based ratios, computed in one pass by the ratio engine.'''
+        return compute_ratios(self.balance_sheet, self.income_statement)
+
+# snapshots are kept for a while so that follow-up questions about the same company do not refetch
+_snapshot_cache = TTLCache(maxsize=settings.ticker_cache_max_size, ttl=settings.ticker_cache_ttl_seconds)
+_snapshot_cache_lock = Lock()
+
+def get_ticker_snapshot(ticker: str) -> TickerSnapshot:
+    '''
+    Get the cached snapshot of a ticker, or create a new one if it is not cached or has expired.
+
+    Args:
+        ticker (str): The ticker symbol of the company
+
+    Returns:
+        TickerSnapshot: The snapshot of the ticker
+    '''
+    key = ticker.strip().upper()
+    with _snapshot_cache_lock:
+        snapshot = _snapshot_cache.get(key)
+        if snapshot is None:
+            snapshot = TickerSnapshot(key)
+            _snapshot_cache[key] = snapshot
+    return snapshot
+
+def clear_ticker_snapshots():
+    '''Drop all cached ticker snapshots.'''
+    with _snapshot_cache_lock:
+        _snapshot_cache.clear()
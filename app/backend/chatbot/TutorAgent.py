@@ -6,7 +6,7 @@ from langchain.agents import AgentExecutor, create_tool_calling_agent
 
 from typing import List, Union
 
-from .agent_tools import get_webpage_content
+from .agent_tools import get_investing_concept
 
 # from .BaseChatBot import BaseChatBot
 from .BaseChatBot import BaseChatBot
@@ -20,7 +20,7 @@ class TutorAgent(BaseChatBot):
     * Your explanations should reflect Buffett-style thinking: focus on fundamentals, avoid speculation, and prioritize businesses with durable advantages.
     
     * This is the workflow you are to follow whenever user asks about a specific investing concept or strategy:
-        1. Use the get_webpage_content tool to search for resources related to the concept or strategy the user is asking about. You must call the tool before doing any analysis.
+        1. Use the get_investing_concept tool to search for resources related to the concept or strategy the user is asking about. You must call the tool before doing any analysis.
         2. Analyze the information, and use it to explain the concept or strategy in detail. You may copy and paste relevant sections from the resources directly into your explanation.
         3. Provide the user with the links to the resources you found.
 
@@ -39,7 +39,7 @@ class TutorAgent(BaseChatBot):
     def __init__(self):
         super().__init__()
         self.tools = [
-            get_webpage_content
+            get_investing_concept
         ]
         self.bot = self._init_bot()
 
@@ -79,7 +79,7 @@ class TutorAgent(BaseChatBot):
             },
             config={
                 'configurable': {
-                    'tool_choice': 'get_webpage_content' # force the tool call
+                    'tool_choice': 'get_investing_concept' # force the tool call
                 }
             }
         ):
@@ -1,14 +1,29 @@
 from langchain_core.tools import tool
 from langchain_community.document_loaders import WebBaseLoader
-from langchain_tavily import TavilySearch
-
-import yfinance as yf
 
 import pandas as pd
 import numpy as np
 
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from functools import lru_cache
+from typing import Union
+
 from bs4 import BeautifulSoup, SoupStrainer
 
+from app.backend.core.config import settings
+from app.backend.database.web_cache import web_cache
+from app.backend.services.screener import query_screener
+from app.backend.services.http_clients import HttpClients, get_http_clients
+from app.backend.services.knowledge_index import get_knowledge_index
+from app.backend.services.news_search import news_search
+
+from .TickerSnapshot import get_ticker_snapshot
+from .ratio_engine import ratio_to_dict
+from .valuation import dcf_price_grid, dcf_price_simulation
+from .passage_ranker import article_text, estimate_tokens, select_passages
+from .tool_formatting import financial_information_table, comparison_table, records_table, by_fiscal_year
+from .tool_executor import run_blocking
+
 # TODO: add more functions and incorporate it into the one tool for the LLM using the yfinance API: look at balance sheet, income statement, cash flow, etc.
 # at the moment, just letting agent decide how to use the tools and letting it chain them together
 
@@ -50,11 +65,7 @@ def get_balance_sheet(ticker: str) -> dict:
         dict: The balance sheet of the company
     '''
     
-    stock = yf.Ticker(ticker)
-    bs = stock.balance_sheet.transpose()
-    bs.index = bs.index.strftime('%Y-%m-%d')
-
-    return bs.to_dict()
+    return get_ticker_snapshot(ticker).balance_sheet.to_dict()
 
 def get_income_statement(ticker: str) -> dict:
     '''
@@ -78,11 +89,7 @@ def get_income_statement(ticker: str) -> dict:
         dict: The income statement of the company
     '''
     
-    stock = yf.Ticker(ticker)
-    income_statement = stock.income_stmt.transpose()
-    income_statement.index = income_statement.index.strftime('%Y-%m-%d')
-
-    return income_statement.to_dict()
+    return get_ticker_snapshot(ticker).income_statement.to_dict()
 
 def get_cash_flow(ticker: str) -> dict:
     '''
@@ -100,11 +107,7 @@ def get_cash_flow(ticker: str) -> dict:
     Returns:
         dict: The cash flow statement of the company
     '''
-    stock = yf.Ticker(ticker)
-    cash_flow = stock.cash_flow.transpose()
-    cash_flow.index = cash_flow.index.strftime('%Y-%m-%d')
-
-    return cash_flow.to_dict()
+    return get_ticker_snapshot(ticker).cash_flow.to_dict()
 
 def calculate_graham_number(ticker: str) -> dict:
     '''
@@ -117,25 +120,7 @@ def calculate_graham_number(ticker: str) -> dict:
     Returns:
         graham_number (dict): The Graham Number of the company over a few years, with date as key and Graham Number as value
     '''
-
-    # get balance sheet and income statements
-    income_statement = get_income_statement(ticker)
-    balance_sheet = get_balance_sheet(ticker)
-
-    diluted_eps = income_statement['Diluted EPS']
-    book_value = balance_sheet['Stockholders Equity']
-    shares_outstanding = balance_sheet['Ordinary Shares Number']
-
-    # convert into format we can use
-    graham_numbers = {}
-
-    for date, eps, book_value, shares_outstanding in zip(diluted_eps.keys(), diluted_eps.values(), book_value.values(), shares_outstanding.values()):
-        if np.isnan(eps) or np.isnan(book_value) or np.isnan(shares_outstanding):
-            continue
-        book_value_ps = book_value / shares_outstanding
-        graham_numbers[date] = round((22.5 * eps * book_value_ps) ** 0.5, 2)
-
-    return graham_numbers
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'graham_number')
 
 def calculate_roe(ticker: str) -> dict:
     '''
@@ -147,19 +132,7 @@ def calculate_roe(ticker: str) -> dict:
     Returns:
         roe (dict): The Return On Equity (ROE) of the company over a few years, with key as date and value as ROE
     '''
-    income_statement = get_income_statement(ticker)
-    balance_sheet = get_balance_sheet(ticker)
-
-    net_income = income_statement['Net Income']
-    shareholders = balance_sheet['Stockholders Equity']
-
-    roe = {}
-    for date, net_income, shareholders in zip(net_income.keys(), net_income.values(), shareholders.values()):
-        if np.isnan(net_income) or np.isnan(shareholders):
-            continue
-        roe[date] = round(net_income / shareholders, 2)
-    
-    return roe
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'roe')
 
 def calculate_roa(ticker: str) -> dict:
     '''
@@ -171,19 +144,7 @@ def calculate_roa(ticker: str) -> dict:
     Returns:
         roa (dict): The Return On Assets (ROA) of the company over a few years, with key as date and value as ROA
     '''
-    income_statement = get_income_statement(ticker)
-    balance_sheet = get_balance_sheet(ticker)
-
-    net_income = income_statement['Net Income']
-    total_assets = balance_sheet['Total Assets']
-
-    roa = {}
-    for date, net_income, total_assets in zip(net_income.keys(), net_income.values(), total_assets.values()):
-        if np.isnan(net_income) or np.isnan(total_assets):
-            continue
-        roa[date] = round(net_income / total_assets, 2)
-    
-    return roa
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'roa')
 
 def get_pe_ratio(ticker: str) -> dict:
     '''
@@ -199,10 +160,7 @@ def get_pe_ratio(ticker: str) -> dict:
     income_statement = get_income_statement(ticker)
     eps = income_statement['Diluted EPS']
 
-    stock = yf.Ticker(ticker)
-    prices = stock.history(period='max')
-    prices['year'] = prices.index.year
-    year_last_prices = prices.groupby('year').last()['Close']
+    year_last_prices = get_ticker_snapshot(ticker).year_end_close
 
     pe_ratios = {}
     for date, eps in eps.items():
@@ -240,17 +198,7 @@ def get_debt_to_equity_ratio(ticker: str) -> dict:
     Returns:
         debt_to_equity_ratio (dict): The Debt to Equity ratio of the company over a few years
     '''
-    balance_sheet = get_balance_sheet(ticker)
-    equity = balance_sheet['Common Stock Equity']
-    total_debt = balance_sheet['Total Debt']
-
-    debt_to_equity_ratio = {}
-    for date, equity, total_debt in zip(equity.keys(), equity.values(), total_debt.values()):
-        if np.isnan(equity) or np.isnan(total_debt):
-            continue
-        debt_to_equity_ratio[date] = round(total_debt / equity, 2)
-
-    return debt_to_equity_ratio
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'debt_to_equity_ratio')
 
 def get_gross_profit_margin(ticker: str) -> list[tuple[str, float]]:
     '''
@@ -262,17 +210,7 @@ def get_gross_profit_margin(ticker: str) -> list[tuple[str, float]]:
     Returns:
         gross_profit_margin (list): The Gross Profit Margin of the company over a few years.
     '''
-    income_statement = get_income_statement(ticker)
-    total_revenue = income_statement['Total Revenue']
-    gross_profit = income_statement['Gross Profit']
-
-    gross_profit_margin = {}
-    for date, total_revenue, gross_profit in zip(total_revenue.keys(), total_revenue.values(), gross_profit.values()):
-        if np.isnan(total_revenue) or np.isnan(gross_profit):
-            continue
-        gross_profit_margin[date] = round(gross_profit / total_revenue, 2)
-
-    return gross_profit_margin
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'gross_profit_margin')
 
 def get_operating_margin(ticker: str) -> dict:
     '''
@@ -284,17 +222,7 @@ def get_operating_margin(ticker: str) -> dict:
     Returns:
         operating_margin (float): The Operating Margin of the company over a few years.
     '''
-    income_statement = get_income_statement(ticker)
-    ebit = income_statement['EBIT']
-    total_revenue = income_statement['Total Revenue']
-
-    operating_margin = {}
-    for date, ebit, total_revenue in zip(ebit.keys(), ebit.values(), total_revenue.values()):
-        if np.isnan(ebit) or np.isnan(total_revenue):
-            continue
-        operating_margin[date] = round(ebit / total_revenue, 2)
-
-    return operating_margin
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'operating_margin')
 
 def get_net_profit_margin(ticker: str) -> dict:
     '''
@@ -306,17 +234,7 @@ def get_net_profit_margin(ticker: str) -> dict:
     Returns:
         net_profit_margin (float): The net profit margin of the company
     '''
-    income_statement = get_income_statement(ticker)
-    net_income = income_statement['Net Income']
-    total_revenue = income_statement['Total Revenue']
-
-    net_profit_margin = {}
-    for date, net_income, total_revenue in zip(net_income.keys(), net_income.values(), total_revenue.values()):
-        if np.isnan(net_income) or np.isnan(total_revenue):
-            continue
-        net_profit_margin[date] = round(net_income / total_revenue, 2)
-
-    return net_profit_margin
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'net_profit_margin')
 
 def get_current_ratio(ticker: str) -> dict:
     '''
@@ -328,17 +246,7 @@ def get_current_ratio(ticker: str) -> dict:
     Returns:
         current_ratio (float): The current ratio of the company over a few years.
     '''
-    balance_sheet = get_balance_sheet(ticker)
-    current_assets = balance_sheet['Current Assets']
-    current_liabilities = balance_sheet['Current Debt']
-
-    current_ratio = {}
-    for date, current_assets, current_liabilities in zip(current_assets.keys(), current_assets.values(), current_liabilities.values()):
-        if np.isnan(current_assets) or np.isnan(current_liabilities):
-            continue
-        current_ratio[date] = round(current_assets / current_liabilities, 2)
-
-    return current_ratio
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'current_ratio')
 
 def get_working_capital(ticker: str) -> dict:
     '''
@@ -350,17 +258,7 @@ def get_working_capital(ticker: str) -> dict:
     Returns:
         working_capital (float): The working capital of the company over a few years.
     '''
-    balance_sheet = get_balance_sheet(ticker)
-    current_assets = balance_sheet['Current Assets']
-    current_liabilities = balance_sheet['Current Debt']
-
-    working_capital = {}
-    for date, current_assets, current_liabilities in zip(current_assets.keys(), current_assets.values(), current_liabilities.values()):
-        if np.isnan(current_assets) or np.isnan(current_liabilities):
-            continue
-        working_capital[date] = round(current_assets - current_liabilities, 2)
-
-    return working_capital
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'working_capital')
 
 def get_current_price(ticker: str):
     '''
@@ -372,11 +270,27 @@ def get_current_price(ticker: str):
     Returns:
         current_price (float): The current price of the stock
     '''
-    data = yf.Ticker(ticker)
-    current_price = data.history(period='1d')['Close'][0]
+    current_price = get_ticker_snapshot(ticker).latest_close
 
     return round(current_price, 2)
 
+def _dcf_inputs(ticker: str) -> tuple[float, float]:
+    '''
+    Get the base free cash flow and the shares outstanding used by the DCF calculations.
+
+    Args:
+        ticker (str): The ticker symbol of the company
+
+    Returns:
+        tuple[float, float]: The free cash flow and the number of shares outstanding
+    '''
+    snapshot = get_ticker_snapshot(ticker)
+    # to play safe, assume cash flow is constant, and we take the average of the last 5 years
+    mean_free_cash_flow = np.nanmean(snapshot.cash_flow['Free Cash Flow'].to_numpy(dtype='float64'))
+    shares_outstanding = snapshot.info.get('sharesOutstanding')
+
+    return mean_free_cash_flow, shares_outstanding
+
 def discounted_cash_flow(ticker: str, discount_rate: float = 0.1) -> dict:
     '''
     Calculates the discounted cash flow of the company given a ticker symbol.
@@ -388,27 +302,136 @@ def discounted_cash_flow(ticker: str, discount_rate: float = 0.1) -> dict:
     Returns:
         dcf (float): The discounted cash flow of the company to arrive at a price per share
     '''
-    
-    cash_flow_statement = get_cash_flow(ticker)
-    free_cash_flow = cash_flow_statement['Free Cash Flow']
-    # to play safe, assume cash flow is constant, and we take the average of the last 5 years
-    mean_free_cash_flow = np.nanmean(list(free_cash_flow.values()))
-    pv_future_cash_flows = []
-    for i in range(1, 6):
-        discounted_cash_flow = mean_free_cash_flow / ((1 + discount_rate) ** i)
-        pv_future_cash_flows.append(discounted_cash_flow)
-
-    # calculate terminal value
-    terminal_value = mean_free_cash_flow * (1 + 0.02) / (discount_rate - 0.02)
-    
-    total_cash_flow = sum(pv_future_cash_flows) + terminal_value
+    free_cash_flow, shares_outstanding = _dcf_inputs(ticker)
+
+    # constant cash flow for 5 years, then growing at 2% forever
+    dcf_price = dcf_price_grid(free_cash_flow, shares_outstanding, [discount_rate], [0.0], [5], terminal_growth=0.02)[0, 0, 0]
+
+    return round(float(dcf_price), 2)
+
+def _dcf_assumptions_error(discount_rates: list[float], growth_rates: list[float], horizons: list[int], *rates: float) -> str:
+    '''The reason the assumptions of a DCF sensitivity are invalid, or None if they are valid.'''
+    if not horizons or any(isinstance(h, bool) or not isinstance(h, (int, np.integer)) or not 1 <= h <= settings.dcf_max_horizon for h in horizons):
+        return f'The horizons must be whole numbers of years from 1 to {settings.dcf_max_horizon}, got {horizons}.'
+    values = [*discount_rates, *growth_rates, *rates]
+    if any(isinstance(value, bool) or not isinstance(value, (int, float, np.number)) or not np.isfinite(value) for value in values):
+        return f'The rates must be finite numbers, got {values}.'
+    return None
+
+def dcf_sensitivity(
+    ticker: str,
+    discount_rates: list[float] = None,
+    growth_rates: list[float] = None,
+    horizons: list[int] = None,
+    terminal_growth: float = 0.02,
+    monte_carlo: bool = False,
+    growth_mean: float = 0.03,
+    growth_std: float = 0.05,
+    simulations: int = 10000
+) -> dict:
+    '''
+    Calculates the DCF price per share of the company for every combination of discount rate, growth rate and horizon,
+    and optionally the distribution of the price per share when the growth rate is uncertain.
+
+    Args:
+        ticker (str): The ticker symbol of the company
+        discount_rates (list[float]): The discount rates, defaults to 6% to 12%
+        growth_rates (list[float]): The yearly growth rates of the free cash flow, defaults to 0% to 6%
+        horizons (list[int]): The number of years of growth before the terminal value, defaults to 5 and 10 years
+        terminal_growth (float): The growth rate of the free cash flow after the horizon
+        monte_carlo (bool): Whether to also simulate the growth rate
+        growth_mean (float): The mean of the simulated yearly growth rate
+        growth_std (float): The standard deviation of the simulated yearly growth rate
+        simulations (int): The number of simulations
+
+    Returns:
+        dict: The price per share by horizon, discount rate and growth rate, and the percentiles of the simulated price per share,
+            or the reason the assumptions are invalid under 'error'
+    '''
+    discount_rates = discount_rates or [0.06, 0.08, 0.1, 0.12]
+    growth_rates = growth_rates if growth_rates is not None else [0.0, 0.03, 0.06]
+    horizons = horizons or [5, 10]
 
-    ticker = yf.Ticker(ticker)
-    shares_outstanding = ticker.info.get('sharesOutstanding')
+    # the assumptions come from the LLM: a horizon of 0 would silently read the wrong column, and a huge one exhaust the memory
+    error = _dcf_assumptions_error(discount_rates, growth_rates, horizons, terminal_growth, growth_mean, growth_std)
+    if error is not None:
+        return {'error': error}
 
-    dcf_price = round(total_cash_flow / shares_outstanding, 2)
+    free_cash_flow, shares_outstanding = _dcf_inputs(ticker)
+    grid = dcf_price_grid(free_cash_flow, shares_outstanding, discount_rates, growth_rates, horizons, terminal_growth)
+
+    res = {
+        'base_free_cash_flow': round(float(free_cash_flow), 2),
+        'shares_outstanding': shares_outstanding,
+        'terminal_growth': terminal_growth,
+        'current_price': get_current_price(ticker),
+        'price_per_share': {
+            f'{horizon} years': {
+                f'discount {discount_rate:.1%}': {
+                    f'growth {growth_rate:.1%}': None if np.isnan(grid[i, j, k]) else round(float(grid[i, j, k]), 2)
+                    for j, growth_rate in enumerate(growth_rates)
+                }
+                for i, discount_rate in enumerate(discount_rates)
+            }
+            for k, horizon in enumerate(horizons)
+        },
+    }
+
+    if monte_carlo:
+        percentiles = (5, 25, 50, 75, 95)
+        simulated = dcf_price_simulation(
+            free_cash_flow, shares_outstanding, discount_rates, horizons, growth_mean, growth_std,
+            terminal_growth, simulations, percentiles
+        )
+        res['monte_carlo'] = {
+            'growth': f'normal, mean {growth_mean:.1%}, std {growth_std:.1%}, {simulations} simulations',
+            'price_per_share_percentiles': {
+                f'{horizon} years': {
+                    f'discount {discount_rate:.1%}': {
+                        f'p{p}': None if np.isnan(simulated[n, i, k]) else round(float(simulated[n, i, k]), 2)
+                        for n, p in enumerate(percentiles)
+                    }
+                    for i, discount_rate in enumerate(discount_rates)
+                }
+                for k, horizon in enumerate(horizons)
+            },
+        }
+
+    return res
+
+@tool
+async def get_dcf_sensitivity(
+    ticker: str,
+    discount_rates: list[float] = None,
+    growth_rates: list[float] = None,
+    horizons: list[int] = None,
+    terminal_growth: float = 0.02,
+    monte_carlo: bool = False,
+    growth_mean: float = 0.03,
+    growth_std: float = 0.05
+) -> dict:
+    '''
+    Get the discounted cash flow (DCF) value per share of the company under many assumptions at once, given a ticker symbol.
+    Use this tool for "what if" questions on the DCF valuation, e.g. "what if the discount rate were 8%?", and to show how
+    sensitive the valuation is to the discount rate, the growth rate and the horizon.
+
+    Args:
+        ticker (str): The ticker symbol of the company
+        discount_rates (list[float]): The discount rates to try, as fractions, e.g. [0.08, 0.1]. Defaults to 6%, 8%, 10% and 12%.
+        growth_rates (list[float]): The yearly growth rates of the free cash flow to try, as fractions, e.g. [0, 0.05]. Defaults to 0%, 3% and 6%.
+        horizons (list[int]): The numbers of years of growth before the terminal value, e.g. [5, 10], in whole years (a few decades at most). Defaults to 5 and 10.
+        terminal_growth (float): The growth rate of the free cash flow after the horizon, as a fraction
+        monte_carlo (bool): Whether to also simulate an uncertain growth rate and return the percentiles of the value per share
+        growth_mean (float): The mean yearly growth rate of the simulation, as a fraction
+        growth_std (float): The standard deviation of the yearly growth rate of the simulation, as a fraction
 
-    return dcf_price
+    Returns:
+        dict: The DCF value per share by horizon, discount rate and growth rate, along with the current price and the inputs used
+    '''
+    return await run_blocking(
+        'get_dcf_sensitivity', dcf_sensitivity, ticker, discount_rates, growth_rates, horizons,
+        terminal_growth, monte_carlo, growth_mean, growth_std
+    )
 
 def get_debt_to_asset_ratio(ticker: str) -> dict:
     '''
@@ -420,20 +443,41 @@ def get_debt_to_asset_ratio(ticker: str) -> dict:
     Returns:
         debt_to_asset_ratio (float): The Debt to Asset ratio of the company over a few years.
     '''
-    balance_sheet = get_balance_sheet(ticker)
-    total_debt = balance_sheet['Total Debt']
-    total_assets = balance_sheet['Total Assets']
+    return ratio_to_dict(get_ticker_snapshot(ticker).ratios, 'debt_to_asset_ratio')
 
-    debt_to_asset_ratio = {}
-    for date, total_debt, total_assets in zip(total_debt.keys(), total_debt.values(), total_assets.values()):
-        if np.isnan(total_debt) or np.isnan(total_assets):
-            continue
-        debt_to_asset_ratio[date] = round(total_debt / total_assets, 2)
+def financial_information(ticker: str) -> dict:
+    '''
+    Calculate all the financial metrics of the company given a ticker symbol.
 
-    return debt_to_asset_ratio
+    Args:
+        ticker (str): The ticker symbol of the company
+
+    Returns:
+        dict: The financial information of the company with keys as the financial metric, and values as a dictionary of key as date and value as the financial metric
+    '''
+    # all the metrics below read from the same cached snapshot of the ticker, so the statements
+    # and price history are only fetched once per tool call (and reused by follow-up questions)
+    res = {}
+    # calculate the date here
+    res['graham_number'] = calculate_graham_number(ticker)
+    res['discounted_cash_flow'] = discounted_cash_flow(ticker)
+    res['roe'] = calculate_roe(ticker)
+    res['roa'] = calculate_roa(ticker)
+    res['pe_ratio'] = get_pe_ratio(ticker)
+    res['earnings_yield'] = get_earnings_yield(ticker)
+    res['debt_to_equity_ratio'] = get_debt_to_equity_ratio(ticker)
+    res['debt_to_asset_ratio'] = get_debt_to_asset_ratio(ticker)
+    res['gross_profit_margin'] = get_gross_profit_margin(ticker)
+    res['operating_margin'] = get_operating_margin(ticker)
+    res['net_profit_margin'] = get_net_profit_margin(ticker)
+    res['current_ratio'] = get_current_ratio(ticker)
+    res['working_capital'] = get_working_capital(ticker)
+    res['current_price'] = get_current_price(ticker)
+
+    return res
 
 @tool
-def get_financial_information(ticker: str) -> dict:
+async def get_financial_information(ticker: str) -> Union[str, dict]:
     '''
     Get the financial information of the company given a ticker symbol.
     Financial information includes:
@@ -456,40 +500,136 @@ def get_financial_information(ticker: str) -> dict:
         ticker (str): The ticker symbol of the company
 
     Returns:
-        dict: The financial information of the company with keys as the financial metric, and values as a dictionary of key as date adn value as the financial metric
+        Union[str, dict]: A table of the financial information of the company, with the financial metrics as rows and the fiscal years as columns.
+            A dictionary with an 'error' key if it failed (or the raw dictionary if settings.tool_output_format is not 'table').
     '''
-    
-    res = {}
-    # calculate the date here
-    res['graham_number'] = calculate_graham_number(ticker)
-    res['discounted_cash_flow'] = discounted_cash_flow(ticker)
-    res['roe'] = calculate_roe(ticker)
-    res['roa'] = calculate_roa(ticker)
-    res['pe_ratio'] = get_pe_ratio(ticker)
-    res['earnings_yield'] = get_earnings_yield(ticker)
-    res['debt_to_equity_ratio'] = get_debt_to_equity_ratio(ticker)
-    res['debt_to_asset_ratio'] = get_debt_to_asset_ratio(ticker)
-    res['gross_profit_margin'] = get_gross_profit_margin(ticker)
-    res['operating_margin'] = get_operating_margin(ticker)
-    res['net_profit_margin'] = get_net_profit_margin(ticker)
-    res['current_ratio'] = get_current_ratio(ticker)
-    res['working_capital'] = get_working_capital(ticker)
-    res['current_price'] = get_current_price(ticker)
+    res = await run_blocking('get_financial_information', financial_information, ticker)
+    return _render(res, financial_information_table)
 
-    return res
+def _render(res: dict, renderer) -> Union[str, dict]:
+    '''Render the output of a tool compactly for the LLM, unless it is an error or the raw output is configured.'''
+    if 'error' in res or settings.tool_output_format != 'table':
+        return res
+    return renderer(res)
+
+def _by_fiscal_year(metric):
+    '''Key a metric by fiscal year instead of fiscal date, so that companies with different fiscal year ends line up.'''
+    if not isinstance(metric, dict):
+        return metric
+    return by_fiscal_year(metric)
+
+def compare_companies(tickers: list[str]) -> dict:
+    '''
+    Calculate all the financial metrics of several companies, fetching them concurrently.
+
+    Args:
+        tickers (list[str]): The ticker symbols of the companies
+
+    Returns:
+        dict: The comparison with keys as the financial metric, and values as a dictionary of key as ticker and value as
+            the financial metric of the company by fiscal year, and the companies that failed under 'errors'
+    '''
+    tickers = list(dict.fromkeys(ticker.strip().upper() for ticker in tickers))
+
+    # fetch the companies concurrently, so the comparison takes about as long as the slowest company
+    results, errors = {}, {}
+    with ThreadPoolExecutor(max_workers=min(settings.batch_fetch_max_workers, max(len(tickers), 1))) as executor:
+        futures = {executor.submit(financial_information, ticker): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                results[ticker] = future.result()
+            except Exception as e:
+                errors[ticker] = str(e)
+
+    comparison = {}
+    for ticker in tickers:
+        for metric, value in results.get(ticker, {}).items():
+            comparison.setdefault(metric, {})[ticker] = _by_fiscal_year(value)
+
+    if errors:
+        comparison['errors'] = errors
+
+    return comparison
 
 @tool
-def get_webpage_content(query: str) -> dict:
+async def compare_financial_information(tickers: list[str]) -> Union[str, dict]:
     '''
-    Gets the content and link of a webpage given a query in natural language (in a dictionary format).
+    Get the financial information of several companies at once given their ticker symbols, to compare them.
+    The financial information is the same as the one of get_financial_information, aligned by fiscal year.
+    Always use this tool instead of get_financial_information when more than one company is involved.
 
     Args:
-        query (str): The query to search for, e.g. "What is the weather in Singapore?"
+        tickers (list[str]): The ticker symbols of the companies, e.g. ["AAPL", "MSFT", "GOOGL"]
 
     Returns:
-        res (dict): A dictionary with the keys 'url' and 'content', where 'url' is the link to the webpage, and 'content' is the content of the webpage.
+        Union[str, dict]: A table of the comparison, with a row per financial metric and company, and the fiscal years as columns.
+            Companies that could not be analyzed are listed below the table.
+            A dictionary with an 'error' key if it failed (or the raw dictionary if settings.tool_output_format is not 'table').
     '''
-    search = TavilySearch(
+    res = await run_blocking('compare_financial_information', compare_companies, tickers)
+    return _render(res, comparison_table)
+
+def screen_companies(
+    sector: str = None,
+    filters: list[str] = None,
+    sort_by: str = 'roe',
+    ascending: bool = False,
+    limit: int = 10
+) -> dict:
+    '''
+    Screen the S&P 500 companies from the precomputed screener table.
+
+    Args:
+        sector (str): Only keep the companies of this sector
+        filters (list[str]): Conditions all companies must meet, e.g. "debt_to_equity_ratio < 1"
+        sort_by (str): The metric to rank the companies by
+        ascending (bool): Whether to rank from the lowest value instead of the highest
+        limit (int): The maximum number of companies to return
+
+    Returns:
+        dict: The ranked companies under 'companies', or the reason the screen failed under 'error'
+    '''
+    try:
+        return {'companies': query_screener(sector, filters, sort_by, ascending, limit)}
+    except FileNotFoundError:
+        return {'error': 'The screener has not been built yet, analyze the companies one by one instead.'}
+    except ValueError as e:
+        return {'error': str(e)}
+
+@tool
+async def screen_stocks(
+    sector: str = None,
+    filters: list[str] = None,
+    sort_by: str = 'roe',
+    ascending: bool = False,
+    limit: int = 10
+) -> Union[str, dict]:
+    '''
+    Screen and rank the S&P 500 companies by their latest financial metrics, e.g. "top 10 ROE in Energy with D/E < 1".
+    Use this tool to find companies matching some criteria, and get_financial_information to analyze one of them in detail.
+    The metrics that can be used to filter and rank are:
+        graham_number, discounted_cash_flow, roe, roa, pe_ratio, earnings_yield, debt_to_equity_ratio, debt_to_asset_ratio,
+        gross_profit_margin, operating_margin, net_profit_margin, current_ratio, working_capital, current_price
+
+    Args:
+        sector (str): Only keep the companies of this GICS sector, e.g. "Energy" or "Information Technology". Leave empty for all sectors.
+        filters (list[str]): Conditions all companies must meet, each one a metric, a comparison (<, <=, >, >=, ==) and a number, e.g. ["debt_to_equity_ratio < 1", "pe_ratio > 0"]
+        sort_by (str): The metric to rank the companies by
+        ascending (bool): True to rank from the lowest value (e.g. lowest P/E), False to rank from the highest (e.g. highest ROE)
+        limit (int): The number of companies to return
+
+    Returns:
+        Union[str, dict]: A table of the ranked companies with their name, sector and latest metrics.
+            A dictionary with the reason the screen failed under 'error' (or the raw dictionary if settings.tool_output_format is not 'table').
+    '''
+    res = await run_blocking('screen_stocks', screen_companies, sector, filters, sort_by, ascending, limit)
+    return _render(res, lambda res: records_table(res['companies']))
+
+@lru_cache(maxsize=1)
+def _article_search(clients: HttpClients):
+    # built once per set of HTTP clients rather than on every call
+    return clients.tavily_search(
         api_key="TAVILY_API_KEY",
         search_type="general",
         language="en",
@@ -497,13 +637,22 @@ def get_webpage_content(query: str) -> dict:
         sort_by="relevancy",
     )
 
-    search_result = search.invoke(
+def _search_url(query: str) -> str:
+    '''Search for the investopedia article about a query and return its url.'''
+    search_result = _article_search(get_http_clients()).invoke(
         input=f"{query} investopedia", # inject investopedia to always find investopedia articles
     )
 
+    return search_result['results'][0]['url']
+
+def _load_page(url: str) -> str:
+    '''Download a page and extract the text of the article, one heading or paragraph per line.'''
     # create a loader to load the webpage content
     loader = WebBaseLoader(
-        web_paths=[search_result['results'][0]['url']],
+        web_paths=[url],
+        session=get_http_clients().session, # keep-alive connections shared by all tool calls
+        requests_kwargs={'timeout': settings.http_timeout_seconds},
+        raise_for_status=True, # an error page (403, 429, 5xx) is not an article, and must not be cached as one
         bs_kwargs={
             'parse_only': SoupStrainer(
                 name=['h2', 'p'], # take content from only these tags since they are the main content of the article
@@ -511,12 +660,107 @@ def get_webpage_content(query: str) -> dict:
         }
     )
 
-    docs = loader.load()
-    text = docs[0].page_content
+    soup = loader.scrape()
+    return article_text(soup.find_all(['h2', 'p']))
+
+def webpage_content(query: str) -> dict:
+    '''
+    Search for a webpage given a query in natural language and get the passages of its content most relevant to the query.
+    Both the search and the page are cached, so that a repeated question does not go to the network.
+
+    Args:
+        query (str): The query to search for
+
+    Returns:
+        res (dict): A dictionary with the keys 'url' and 'content'
+    '''
+    url = web_cache.get_url(query, _search_url)
+
+    res = {
+        'url': url,
+        'content': select_passages(web_cache.get_page(url, _load_page), query)
+    }
+
+    return res
+
+@tool
+async def get_webpage_content(query: str) -> dict:
+    '''
+    Gets the content and link of a webpage given a query in natural language (in a dictionary format).
+
+    Args:
+        query (str): The query to search for, e.g. "What is the weather in Singapore?"
+
+    Returns:
+        res (dict): A dictionary with the keys 'url' and 'content', where 'url' is the link to the webpage, and 'content' is the passages of the webpage most relevant to the query.
+    '''
+    return await run_blocking('get_webpage_content', webpage_content, query)
+
+def investing_concept(query: str) -> dict:
+    '''
+    Get the passages most relevant to a question about an investing concept, from the offline knowledge index,
+    or from a web search if the index has nothing relevant (or is not built).
+
+    Args:
+        query (str): The question about the concept
+
+    Returns:
+        res (dict): A dictionary with the keys 'sources' (the links to cite) and 'content'
+    '''
+    index = get_knowledge_index()
+    hits = index.search(query) if index is not None else []
+
+    if not hits:
+        res = webpage_content(query)
+        return {
+            'sources': [res['url']],
+            'content': res['content']
+        }
+
+    # best passages first, within the same budget as a scraped article
+    passages, sources, used = [], [], 0
+    for hit in hits:
+        tokens = estimate_tokens(hit['text'])
+        if passages and used + tokens > settings.passage_token_budget:
+            break
+        passages.append(f"{hit['title']}\n{hit['text']}")
+        used += tokens
+        if hit['source'] not in sources:
+            sources.append(hit['source'])
 
     res = {
-        'url': search_result['results'][0]['url'],
-        'content': text
+        'sources': sources,
+        'content': '\n\n'.join(passages)
     }
 
-    return res
\ No newline at end of file
+    return res
+
+@tool
+async def get_investing_concept(query: str) -> dict:
+    '''
+    Gets resources about an investing concept or strategy given a question in natural language (in a dictionary format).
+
+    Args:
+        query (str): The question about the concept or strategy, e.g. "What is an economic moat?"
+
+    Returns:
+        res (dict): A dictionary with the keys 'sources' and 'content', where 'sources' are the links to the resources, and 'content' is the passages of the resources most relevant to the question.
+    '''
+    return await run_blocking('get_investing_concept', investing_concept, query)
+
+@tool
+async def search_news(query: str) -> dict:
+    '''
+    Searches for recent news articles given a query in natural language (in a dictionary format).
+
+    Args:
+        query (str): The query to search for, e.g. "Apple earnings"
+
+    Returns:
+        res (dict): A dictionary with the keys 'query' and 'results', where 'results' is a list of articles, each with its 'title', 'url', 'content' and 'published_date'.
+    '''
+    try:
+        return await news_search.search(query)
+    except Exception as e:
+        # let the agent tell the user instead of failing the whole response
+        return {'error': f'Could not search for news about {query}: {e}'}
@@ -0,0 +1,106 @@
+from functools import lru_cache
+
+from langchain_core.embeddings import Embeddings
+
+from app.backend.core.config import settings
+from app.backend.chatbot.CachedEmbeddings import CachedEmbeddings
+
+# embedding models the chat history and the knowledge index can run on, selected with settings.embedding_backend.
+# Vectors of the same model (full and int8) are close enough to share an index; another model writes vectors of
+# another dimension, so it gets its own chat index (see chat_index_name) and the knowledge index must be rebuilt.
+EMBEDDING_BACKENDS = {
+    # the original model in full precision
+    'full': {
+        'model_name': 'sentence-transformers/all-mpnet-base-v2',
+        'quantize': False,
+    },
+    # the same model with int8 weights in its linear layers (dynamic quantization), faster on CPU
+    'int8': {
+        'model_name': 'sentence-transformers/all-mpnet-base-v2',
+        'quantize': True,
+    },
+    # a much smaller model (6 layers, 384 dimensions), the fastest
+    'small': {
+        'model_name': 'sentence-transformers/all-MiniLM-L6-v2',
+        'quantize': False,
+    },
+}
+
+# the model of the existing chat index, whose name is kept as it is
+DEFAULT_MODEL_NAME = 'sentence-transformers/all-mpnet-base-v2'
+
+def _backend(backend: str) -> dict:
+    if backend not in EMBEDDING_BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {', '.join(EMBEDDING_BACKENDS)}")
+    return EMBEDDING_BACKENDS[backend]
+
+def embedding_namespace(backend: str = settings.embedding_backend) -> str:
+    '''
+    Get the name the vectors of a backend are cached under, so that the vectors of different backends never mix.
+
+    Args:
+        backend (str): The name of the backend
+
+    Returns:
+        str: The name of the model, suffixed with the quantization if any (the full model keeps its existing cache)
+    '''
+    spec = _backend(backend)
+    name = spec['model_name'].split('/')[-1]
+    return f"{name}-int8" if spec['quantize'] else name
+
+def chat_index_name(backend: str = settings.embedding_backend) -> str:
+    '''
+    Get the name of the chat index of a backend, so that vectors of different dimensions never go into the same index.
+
+    Args:
+        backend (str): The name of the backend
+
+    Returns:
+        str: settings.chat_index_name for the original model (full or int8), suffixed with the model name otherwise
+    '''
+    spec = _backend(backend)
+    if spec['model_name'] == DEFAULT_MODEL_NAME:
+        return settings.chat_index_name
+    return f"{settings.chat_index_name}_{spec['model_name'].split('/')[-1]}"
+
+def create_embeddings(backend: str = settings.embedding_backend) -> Embeddings:
+    '''
+    Load the embedding model of a backend.
+
+    Args:
+        backend (str): The name of the backend, one of EMBEDDING_BACKENDS
+
+    Returns:
+        Embeddings: The embedding model, on CPU
+    '''
+    spec = _backend(backend)
+    # imported here, loading torch is only paid by the processes that embed
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    embeddings = HuggingFaceEmbeddings(
+        model_name=spec['model_name'],
+        encode_kwargs={'batch_size': settings.embedding_batch_size}
+    )
+    if spec['quantize']:
+        import torch
+
+        # int8 weights, activations quantized on the fly: no calibration, and the linear layers are most of the compute
+        torch.quantization.quantize_dynamic(embeddings._client, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+    return embeddings
+
+def create_cached_embeddings(backend: str = settings.embedding_backend) -> CachedEmbeddings:
+    '''
+    Load the embedding model of a backend, behind the embedding cache.
+
+    Args:
+        backend (str): The name of the backend, one of EMBEDDING_BACKENDS
+
+    Returns:
+        CachedEmbeddings: The embedding model, with its vectors cached under the namespace of the backend
+    '''
+    return CachedEmbeddings(create_embeddings(backend), namespace=embedding_namespace(backend))
+
+@lru_cache(maxsize=None)
+def get_embeddings(backend: str = settings.embedding_backend) -> CachedEmbeddings:
+    '''Get the cached embedding model of a backend shared by the whole process, loading it on first use.'''
+    return create_cached_embeddings(backend)
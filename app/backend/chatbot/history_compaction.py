@@ -0,0 +1,89 @@
+import re
+
+from functools import lru_cache
+
+from langchain_core.messages import HumanMessage, AIMessage
+
+from app.backend.core.config import settings
+from app.backend.chatbot.passage_ranker import estimate_tokens
+
+# compaction of the chat history given to the agents: the latest turns as they are, older ones as short extractive
+# summaries (the headings of a report and the first sentence under each), all within a token budget
+
+HEADING_PATTERN = re.compile(r'^(#+\s*(?P<markdown>.+)|\*\*(?P<bold>[^*]+)\*\*:?)$')
+SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+LIST_MARKER = re.compile(r'^([-*+]|\d+[.)])\s+')
+
+@lru_cache(maxsize=1024)
+def summarize(text: str, max_tokens: int = settings.history_summary_tokens) -> str:
+    '''
+    Summarize a message by its headings and the first sentence of each of its sections.
+
+    Args:
+        text (str): The message, usually a markdown report of the agents
+        max_tokens (int): The maximum number of tokens of the summary
+
+    Returns:
+        str: The message itself if it is short enough, else its summary, one line per heading or sentence
+    '''
+    if estimate_tokens(text) <= max_tokens:
+        return text
+
+    lines, in_section = [], False
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        heading = HEADING_PATTERN.match(line)
+        if heading:
+            lines.append((heading.group('markdown') or heading.group('bold')).strip() + ':')
+            in_section = False
+        elif not in_section:
+            # only the first sentence of a section, which usually states its point
+            lines.append(SENTENCE_END.split(LIST_MARKER.sub('', line), maxsplit=1)[0])
+            in_section = True
+
+    summary, used = [], 0
+    for line in lines:
+        tokens = estimate_tokens(line)
+        if used + tokens > max_tokens:
+            break
+        summary.append(line)
+        used += tokens
+
+    # a single paragraph over the budget is cut
+    return '\n'.join(summary) if summary else text[:max_tokens * 4]
+
+def message_summary(message: HumanMessage | AIMessage) -> str:
+    '''The summary stored with a message if there is one, else computed from its content.'''
+    return message.additional_kwargs.get('summary') or summarize(message.content)
+
+def compact_history(
+    messages: list[HumanMessage | AIMessage],
+    token_budget: int = settings.history_token_budget,
+    verbatim_turns: int = settings.history_verbatim_turns
+) -> list[HumanMessage | AIMessage]:
+    '''
+    Fit the chat history into a token budget, keeping the latest turns verbatim and summarizing the older ones.
+
+    Args:
+        messages (list[HumanMessage | AIMessage]): The chat history, oldest first
+        token_budget (int): The maximum number of tokens of the history
+        verbatim_turns (int): The number of latest turns (a message and its answer) kept verbatim when they fit
+
+    Returns:
+        list[HumanMessage | AIMessage]: The compacted history, oldest first, without the oldest messages that do not fit
+    '''
+    compacted, used = [], 0
+    # newest first, so that the budget goes to the latest turns
+    for position, message in enumerate(reversed(messages)):
+        text = message.content
+        if position >= verbatim_turns * 2 or used + estimate_tokens(text) > token_budget:
+            text = message_summary(message)
+        tokens = estimate_tokens(text)
+        if used + tokens > token_budget:
+            break
+        compacted.append(HumanMessage(content=text) if isinstance(message, HumanMessage) else AIMessage(content=text))
+        used += tokens
+
+    return compacted[::-1]
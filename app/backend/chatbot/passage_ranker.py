@@ -0,0 +1,141 @@
+import re
+
+from typing import Iterable, Iterator
+
+import numpy as np
+
+from app.backend.core.config import settings
+
+# passage-level selection of scraped articles: only the passages relevant to the question go into the agent context
+
+HEADING_PREFIX = '## '
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def estimate_tokens(text: str) -> int:
+    # rough estimate of about 4 characters per token, good enough for a budget
+    return len(text) // 4 + 1
+
+def article_text(elements: Iterable) -> str:
+    '''
+    Turn the elements of an article (h2 and p tags) into text with one block per line, headings prefixed with '## '.
+
+    Args:
+        elements (Iterable): The BeautifulSoup elements of the article, in order
+
+    Returns:
+        str: The text of the article
+    '''
+    lines = []
+    for element in elements:
+        text = element.get_text(' ', strip=True)
+        if text:
+            lines.append(HEADING_PREFIX + text if element.name == 'h2' else text)
+    return '\n'.join(lines)
+
+def iter_passages(text: str, max_chars: int = settings.passage_max_chars) -> Iterator[str]:
+    '''
+    Split the text of an article into passages, streaming them as they are read.
+    Consecutive paragraphs of a section are grouped up to max_chars, and every passage starts with the heading of its section.
+
+    Args:
+        text (str): The text of the article, as returned by article_text
+        max_chars (int): The maximum length of a passage, unless a single paragraph is longer
+
+    Returns:
+        Iterator[str]: The passages, in the order of the article
+    '''
+    heading = ''
+    paragraphs = []
+    size = 0
+
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith(HEADING_PREFIX):
+            if paragraphs:
+                yield '\n'.join([heading] + paragraphs if heading else paragraphs)
+            heading, paragraphs, size = line[len(HEADING_PREFIX):], [], 0
+            continue
+
+        if paragraphs and size + len(line) > max_chars:
+            yield '\n'.join([heading] + paragraphs if heading else paragraphs)
+            paragraphs, size = [], 0
+        paragraphs.append(line)
+        size += len(line)
+
+    if paragraphs:
+        yield '\n'.join([heading] + paragraphs if heading else paragraphs)
+
+def bm25_scores(passages: list[str], query: str, k1: float = 1.5, b: float = 0.75) -> np.ndarray:
+    '''
+    Score passages against a query with Okapi BM25.
+
+    Args:
+        passages (list[str]): The passages
+        query (str): The query
+        k1 (float): The term frequency saturation
+        b (float): The length normalization
+
+    Returns:
+        np.ndarray: The score of every passage
+    '''
+    terms = list(dict.fromkeys(tokenize(query)))
+    if not passages or not terms:
+        return np.zeros(len(passages))
+
+    tokenized = [tokenize(passage) for passage in passages]
+    lengths = np.array([len(tokens) for tokens in tokenized], dtype='float64')
+    column = {term: i for i, term in enumerate(terms)}
+
+    # term frequencies of the query terms only, of shape (passages, terms)
+    frequencies = np.zeros((len(passages), len(terms)))
+    for row, tokens in enumerate(tokenized):
+        for token in tokens:
+            i = column.get(token)
+            if i is not None:
+                frequencies[row, i] += 1
+
+    n = len(passages)
+    document_frequencies = (frequencies > 0).sum(axis=0)
+    idf = np.log((n - document_frequencies + 0.5) / (document_frequencies + 0.5) + 1)
+
+    norm = k1 * (1 - b + b * lengths / max(lengths.mean(), 1))[:, None]
+    return (idf * frequencies * (k1 + 1) / (frequencies + norm)).sum(axis=1)
+
+def select_passages(text: str, query: str, token_budget: int = settings.passage_token_budget) -> str:
+    '''
+    Keep the passages of an article most relevant to a query, within a token budget.
+
+    Args:
+        text (str): The text of the article, as returned by article_text
+        query (str): The question of the user
+        token_budget (int): The maximum number of tokens of the selected passages
+
+    Returns:
+        str: The selected passages in the order of the article, separated by blank lines
+    '''
+    passages = list(iter_passages(text))
+    scores = bm25_scores(passages, query)
+
+    # most relevant first; when nothing matches, the stable sort keeps the order of the article (its introduction first)
+    order = np.argsort(-scores, kind='stable')
+    selected, used = [], 0
+    for i in order:
+        tokens = estimate_tokens(passages[i])
+        if used + tokens > token_budget:
+            # a smaller passage further down may still fit
+            continue
+        selected.append(i)
+        used += tokens
+
+    if not selected and passages:
+        # even the best passage is over the budget, so cut it
+        return passages[order[0]][:token_budget * 4]
+
+    return '\n\n'.join(passages[i] for i in sorted(selected))
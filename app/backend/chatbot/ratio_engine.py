@@ -0,0 +1,110 @@
+import pandas as pd
+import numpy as np
+
+# columnar engine that computes all the statement based ratios of the agent tools in a single vectorized pass
+
+# ratios returned by compute_ratios, in order
+RATIO_COLUMNS = [
+    'graham_number',
+    'roe',
+    'roa',
+    'debt_to_equity_ratio',
+    'debt_to_asset_ratio',
+    'gross_profit_margin',
+    'operating_margin',
+    'net_profit_margin',
+    'current_ratio',
+    'working_capital',
+]
+
+# line items used by the engine, missing ones are treated as not reported
+BALANCE_SHEET_ITEMS = [
+    'Stockholders Equity',
+    'Common Stock Equity',
+    'Ordinary Shares Number',
+    'Total Assets',
+    'Total Debt',
+    'Current Assets',
+    'Current Debt',
+]
+INCOME_STATEMENT_ITEMS = [
+    'Net Income',
+    'Total Revenue',
+    'Gross Profit',
+    'EBIT',
+    'Diluted EPS',
+]
+
+def _line_items(statement: pd.DataFrame, items: list[str]) -> dict[str, np.ndarray]:
+    '''
+    Get the line items of a statement as float arrays, with NaN for values (or whole line items) that are not reported.
+
+    Args:
+        statement (pd.DataFrame): The statement, with line items as columns
+        items (list[str]): The line items to get
+
+    Returns:
+        dict[str, np.ndarray]: The line items, with name as key and values over the rows of the statement as value
+    '''
+    values = statement.reindex(columns=items).apply(pd.to_numeric, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+    return dict(zip(items, values.T))
+
+def compute_ratios(balance_sheet: pd.DataFrame, income_statement: pd.DataFrame) -> pd.DataFrame:
+    '''
+    Compute every statement based ratio for all fiscal dates in one pass.
+
+    The statements are aligned on their index, so they can be the statements of a single company
+    (indexed by fiscal date), or the statements of many companies stacked together (indexed by ticker and fiscal date)
+    to screen them all at once. Only dates present in both statements are kept. Missing line items, missing values
+    and divisions by zero give NaN instead of raising.
+
+    Args:
+        balance_sheet (pd.DataFrame): The balance sheet, with line items as columns
+        income_statement (pd.DataFrame): The income statement, with line items as columns
+
+    Returns:
+        pd.DataFrame: One row per fiscal date, with the columns in RATIO_COLUMNS as float64
+    '''
+    if not balance_sheet.index.equals(income_statement.index):
+        balance_sheet, income_statement = balance_sheet.align(income_statement, join='inner', axis=0)
+
+    bs = _line_items(balance_sheet, BALANCE_SHEET_ITEMS)
+    inc = _line_items(income_statement, INCOME_STATEMENT_ITEMS)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # the Graham Number is only defined when both EPS and book value are positive
+        eps = inc['Diluted EPS']
+        book_value_per_share = bs['Stockholders Equity'] / bs['Ordinary Shares Number']
+        graham_number = np.sqrt(np.where((eps > 0) & (book_value_per_share > 0), 22.5 * eps * book_value_per_share, np.nan))
+
+        ratios = np.column_stack([
+            graham_number,
+            inc['Net Income'] / bs['Stockholders Equity'],
+            inc['Net Income'] / bs['Total Assets'],
+            bs['Total Debt'] / bs['Common Stock Equity'],
+            bs['Total Debt'] / bs['Total Assets'],
+            inc['Gross Profit'] / inc['Total Revenue'],
+            inc['EBIT'] / inc['Total Revenue'],
+            inc['Net Income'] / inc['Total Revenue'],
+            bs['Current Assets'] / bs['Current Debt'],
+            bs['Current Assets'] - bs['Current Debt'],
+        ])
+
+    # division by zero is not a meaningful ratio
+    ratios[np.isinf(ratios)] = np.nan
+
+    return pd.DataFrame(ratios, index=balance_sheet.index, columns=RATIO_COLUMNS)
+
+def ratio_to_dict(ratios: pd.DataFrame, name: str, decimals: int = 2) -> dict:
+    '''
+    Convert one ratio computed by compute_ratios to the format returned by the agent tools.
+
+    Args:
+        ratios (pd.DataFrame): The ratios returned by compute_ratios
+        name (str): The ratio to convert, one of RATIO_COLUMNS
+        decimals (int): The number of decimals to round to
+
+    Returns:
+        dict: The ratio with date as key and ratio as value, without the dates where it is not defined
+    '''
+    return ratios[name].dropna().round(decimals).to_dict()
@@ -0,0 +1,66 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable
+
+from app.backend.core.config import settings
+
+# bounded pool for the blocking work (network I/O, pandas) of the agent tools, shared by all tools
+_executor = ThreadPoolExecutor(max_workers=settings.tool_executor_max_workers, thread_name_prefix='agent-tool')
+
+# tool name -> semaphore limiting the number of calls of that tool running at the same time
+_semaphores: dict[str, asyncio.Semaphore] = {}
+
+def _semaphore(name: str, max_concurrency: int) -> asyncio.Semaphore:
+    if name not in _semaphores:
+        _semaphores[name] = asyncio.Semaphore(max_concurrency)
+    return _semaphores[name]
+
+async def run_blocking(
+    name: str,
+    fn: Callable[..., Any],
+    *args,
+    max_concurrency: int = None,
+    timeout: float = None,
+    **kwargs
+) -> Any:
+    '''
+    Run the blocking part of an agent tool in the tool thread pool, so that the event loop keeps streaming to other users.
+
+    Args:
+        name (str): The name of the tool, calls with the same name share a concurrency limit
+        fn (Callable): The blocking function to run
+        *args: The positional arguments of the function
+        max_concurrency (int): The maximum number of calls of this tool running at the same time, defaults to its limit in
+            settings.tool_concurrency, or settings.tool_max_concurrency for the tools without one
+        timeout (float): The maximum number of seconds to wait for the result, defaults to settings.tool_timeout_seconds
+        **kwargs: The keyword arguments of the function
+
+    Returns:
+        Any: The result of the function, or a dictionary with an 'error' key if it timed out
+    '''
+    max_concurrency = max_concurrency or settings.tool_concurrency.get(name, settings.tool_max_concurrency)
+    timeout = timeout or settings.tool_timeout_seconds
+
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphore(name, max_concurrency)
+    deadline = loop.time() + timeout
+
+    def release(future: asyncio.Future):
+        semaphore.release()
+        if not future.cancelled():
+            # a call that failed after its timeout has nobody left to raise to
+            future.exception()
+
+    try:
+        # the timeout includes the time spent waiting for a slot, so a backlog of slow calls cannot hang a stream
+        await asyncio.wait_for(semaphore.acquire(), timeout)
+        future = loop.run_in_executor(_executor, partial(fn, *args, **kwargs))
+        # the slot is held until the thread is done, even after a timeout, so that the limit bounds the work really running
+        future.add_done_callback(release)
+        # only the wait times out, a running thread cannot be interrupted
+        return await asyncio.wait_for(asyncio.shield(future), max(deadline - loop.time(), 0))
+    except asyncio.TimeoutError:
+        # let the agent tell the user instead of failing the whole response
+        return {'error': f'{name} did not respond within {timeout:g} seconds, try again later.'}
@@ -0,0 +1,138 @@
+import math
+
+import pandas as pd
+
+from app.backend.core.config import settings
+
+# compact rendering of tool outputs for the LLM context: a table costs far fewer tokens than nested dictionaries
+
+def format_number(value, precision: int = settings.tool_output_precision) -> str:
+    '''
+    Format a number compactly, with a suffix for large amounts (e.g. 12.35B).
+
+    Args:
+        value: The number to format, or None/NaN for a missing value
+        precision (int): The number of decimals
+
+    Returns:
+        str: The formatted number, or an empty string for a missing value
+    '''
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ''
+    if not isinstance(value, (int, float)):
+        return str(value)
+
+    for threshold, suffix in ((1e12, 'T'), (1e9, 'B'), (1e6, 'M')):
+        if abs(value) >= threshold:
+            return f'{value / threshold:.{precision}f}{suffix}'
+    return f'{value:.{precision}f}'
+
+def _year(key: str) -> str:
+    # fiscal dates are rendered as fiscal years, other keys (e.g. already years) are kept as they are
+    try:
+        return str(pd.to_datetime(key).year)
+    except (ValueError, TypeError):
+        return str(key)
+
+def by_fiscal_year(values: dict) -> dict:
+    '''
+    Key values by fiscal year instead of fiscal date, keeping the full date of the periods that share a year
+    (e.g. after a change of fiscal year end) so that none of them overwrites another.
+
+    Args:
+        values (dict): Fiscal date (or year) -> value
+
+    Returns:
+        dict: Fiscal year (or fiscal date, for the periods sharing a year) -> value
+    '''
+    years = [_year(key) for key in values]
+    return {
+        (year if years.count(year) == 1 else str(key)[:10]): value
+        for (key, value), year in zip(values.items(), years)
+    }
+
+def to_table(rows: dict, precision: int = settings.tool_output_precision) -> str:
+    '''
+    Render rows of values over time as one markdown table, with the rows as given and the fiscal years as columns.
+    Rows with a single value (e.g. the current price) are listed below the table instead.
+
+    Args:
+        rows (dict): Row label -> either a dictionary of fiscal date (or year) -> value, or a single value
+        precision (int): The number of decimals
+
+    Returns:
+        str: The markdown table
+    '''
+    series = {label: by_fiscal_year(values) for label, values in rows.items() if isinstance(values, dict)}
+    scalars = {label: value for label, value in rows.items() if not isinstance(value, dict)}
+
+    lines = []
+    years = sorted({year for values in series.values() for year in values}, reverse=True)
+    if years:
+        lines.append('| metric | ' + ' | '.join(years) + ' |')
+        lines.append('|---' * (len(years) + 1) + '|')
+        for label, values in series.items():
+            lines.append(f'| {label} | ' + ' | '.join(format_number(values.get(year), precision) for year in years) + ' |')
+
+    for label, value in scalars.items():
+        lines.append(f'{label}: {format_number(value, precision) or "n/a"}')
+
+    return '\n'.join(lines)
+
+def records_table(records: list[dict], precision: int = settings.tool_output_precision) -> str:
+    '''
+    Render a list of records (e.g. companies) as a markdown table with a row per record.
+
+    Args:
+        records (list[dict]): The records, all with the same keys
+        precision (int): The number of decimals
+
+    Returns:
+        str: The markdown table
+    '''
+    if not records:
+        return 'no results'
+    columns = list(records[0])
+    lines = [
+        '| ' + ' | '.join(columns) + ' |',
+        '|---' * len(columns) + '|',
+    ]
+    for record in records:
+        lines.append('| ' + ' | '.join(format_number(record.get(column), precision) for column in columns) + ' |')
+    return '\n'.join(lines)
+
+def financial_information_table(info: dict, precision: int = settings.tool_output_precision) -> str:
+    '''
+    Render the output of financial_information as a table with metrics as rows and fiscal years as columns.
+
+    Args:
+        info (dict): Metric -> dictionary of fiscal date -> value, or a single value
+        precision (int): The number of decimals
+
+    Returns:
+        str: The markdown table
+    '''
+    return to_table(info, precision)
+
+def comparison_table(comparison: dict, precision: int = settings.tool_output_precision) -> str:
+    '''
+    Render the output of compare_companies as one table with a row per metric and company, and fiscal years as columns.
+
+    Args:
+        comparison (dict): Metric -> ticker -> dictionary of fiscal year -> value, or a single value; and the failed companies under 'errors'
+        precision (int): The number of decimals
+
+    Returns:
+        str: The markdown table
+    '''
+    rows = {
+        f'{metric} {ticker}': values
+        for metric, by_ticker in comparison.items() if metric != 'errors'
+        for ticker, values in by_ticker.items()
+    }
+    table = to_table(rows, precision)
+
+    if comparison.get('errors'):
+        table += '\n' + '\n'.join(f'could not analyze {ticker}: {error}' for ticker, error in comparison['errors'].items())
+
+    return table
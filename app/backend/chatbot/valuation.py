@@ -0,0 +1,95 @@
+import numpy as np
+
+# vectorized discounted cash flow engine: every combination of discount rate, growth rate and horizon in one pass
+
+def dcf_price_grid(
+    free_cash_flow: float,
+    shares_outstanding: float,
+    discount_rates: np.ndarray,
+    growth_rates: np.ndarray,
+    horizons: np.ndarray,
+    terminal_growth: float = 0.02
+) -> np.ndarray:
+    '''
+    Calculate the DCF price per share for every combination of discount rate, growth rate and horizon.
+
+    The free cash flow grows at the growth rate for every year of the horizon, then at the terminal growth rate forever.
+    Both the yearly cash flows and the terminal value are discounted back to today.
+
+    Args:
+        free_cash_flow (float): The free cash flow of the latest year, the base of the projection
+        shares_outstanding (float): The number of shares outstanding
+        discount_rates (np.ndarray): The discount rates, e.g. [0.08, 0.1, 0.12]
+        growth_rates (np.ndarray): The yearly growth rates of the free cash flow over the horizon, e.g. [0, 0.03, 0.06]
+        horizons (np.ndarray): The number of years of growth before the terminal value, e.g. [5, 10]
+        terminal_growth (float): The growth rate of the free cash flow after the horizon
+
+    Returns:
+        np.ndarray: The price per share, of shape (discount rates, growth rates, horizons). NaN where the
+            discount rate is not above the terminal growth rate, since the terminal value is then not defined.
+    '''
+    r = np.asarray(discount_rates, dtype='float64')[:, None, None]
+    g = np.asarray(growth_rates, dtype='float64')[None, :, None]
+    horizons = np.asarray(horizons, dtype='int64')
+    years = np.arange(1, horizons.max() + 1)
+
+    # present value of the cash flows of every year up to the longest horizon, then summed up to each horizon
+    discounted = free_cash_flow * ((1 + g) / (1 + r)) ** years
+    present_value = np.cumsum(discounted, axis=-1)[..., horizons - 1]
+
+    h = horizons[None, None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terminal_value = free_cash_flow * (1 + g) ** h * (1 + terminal_growth) / (r - terminal_growth)
+        price = (present_value + terminal_value / (1 + r) ** h) / shares_outstanding
+
+    return np.where(r > terminal_growth, price, np.nan)
+
+def dcf_price_simulation(
+    free_cash_flow: float,
+    shares_outstanding: float,
+    discount_rates: np.ndarray,
+    horizons: np.ndarray,
+    growth_mean: float,
+    growth_std: float,
+    terminal_growth: float = 0.02,
+    simulations: int = 10000,
+    percentiles: tuple = (5, 25, 50, 75, 95),
+    seed: int = None
+) -> np.ndarray:
+    '''
+    Monte Carlo DCF: draw the yearly growth of the free cash flow from a normal distribution, and get the distribution
+    of the price per share for every combination of discount rate and horizon.
+
+    Args:
+        free_cash_flow (float): The free cash flow of the latest year, the base of the projection
+        shares_outstanding (float): The number of shares outstanding
+        discount_rates (np.ndarray): The discount rates
+        horizons (np.ndarray): The number of years of growth before the terminal value
+        growth_mean (float): The mean of the yearly growth rate
+        growth_std (float): The standard deviation of the yearly growth rate
+        terminal_growth (float): The growth rate of the free cash flow after the horizon
+        simulations (int): The number of simulated growth paths
+        percentiles (tuple): The percentiles of the price per share to return
+        seed (int): The random seed, for reproducible results
+
+    Returns:
+        np.ndarray: The percentiles of the price per share, of shape (percentiles, discount rates, horizons)
+    '''
+    rng = np.random.default_rng(seed)
+    r = np.asarray(discount_rates, dtype='float64')[None, :, None]
+    horizons = np.asarray(horizons, dtype='int64')
+    years = np.arange(1, horizons.max() + 1)
+
+    # one growth path per simulation, shared by all discount rates so that they are comparable
+    growth = rng.normal(growth_mean, growth_std, size=(simulations, 1, years.size))
+    cash_flows = free_cash_flow * np.cumprod(1 + growth, axis=-1)
+    present_value = np.cumsum(cash_flows / (1 + r) ** years, axis=-1)[..., horizons - 1]
+
+    last_cash_flow = cash_flows[..., horizons - 1]
+    h = horizons[None, None, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        terminal_value = last_cash_flow * (1 + terminal_growth) / (r - terminal_growth)
+        price = (present_value + terminal_value / (1 + r) ** h) / shares_outstanding
+
+    price = np.where(r > terminal_growth, price, np.nan)
+    return np.percentile(price, percentiles, axis=0)
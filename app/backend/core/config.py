@@ -4,6 +4,36 @@ class Settings(BaseSettings):
     app_name: str = "Investing Chat Bot"
     env: str = "dev"
     redis_url: str = "redis://localhost:6379/0"
+    # connections to Redis shared by all sessions, and how long to wait for a free one
+    redis_max_connections: int = 50
+    redis_pool_timeout_seconds: float = 10.0
+    # one RediSearch index for the chat messages of all sessions, filtered by session at retrieval
+    chat_index_name: str = "chat_messages"
+    # embeddings of chat messages cached by content hash: vectors kept in process, and how long they are kept in Redis
+    embedding_cache_size: int = 10000
+    embedding_cache_ttl_seconds: int = 30 * 24 * 60 * 60
+    # embedding model of the chat messages and the knowledge index, one of full, int8 or small
+    # (see chatbot/embedding_backends.py), and the texts embedded per forward pass
+    embedding_backend: str = "full"
+    embedding_batch_size: int = 32
+    # latest turns (a message and its answer) of every active session kept in process, given to the agents as they are
+    recent_turns: int = 3
+    # threads embedding the retrieval queries of the chat history, off the event loop
+    history_executor_max_workers: int = 4
+    # messages per page of the chat history endpoint, by default and at most
+    chat_history_page_size: int = 50
+    chat_history_max_page_size: int = 200
+    # tokens of chat history given to the agents at most, latest turns kept verbatim (if they fit),
+    # and tokens of the summaries of the older messages (longer AI answers are stored with one)
+    history_token_budget: int = 2000
+    history_verbatim_turns: int = 1
+    history_summary_tokens: int = 120
+    # chat turns waiting to be persisted (the chats wait beyond that), turns written per batch, retries of a failed
+    # batch, and how long the shutdown waits for the queued turns to be written
+    persistence_queue_max_size: int = 1000
+    persistence_batch_size: int = 64
+    persistence_max_retries: int = 3
+    persistence_flush_timeout_seconds: float = 30.0
 
     groq_api_key: str
     google_api_key: str
@@ -13,4 +43,72 @@ class Settings(BaseSettings):
     jwt_secret_key: str
     algorithm: str = "HS256"
 
-settings = Settings()
\ No newline at end of file
+    # cache of ticker snapshots shared by the agent tools
+    ticker_cache_ttl_seconds: int = 15 * 60
+    ticker_cache_max_size: int = 128
+
+    # local store of market data, so that statements are not refetched on every tool call
+    market_data_db_url: str = "sqlite:///app/backend/database/market_data.db"
+    # how often to check a ticker for a new fiscal period at most, and how long to trust the stored statements at most
+    fundamentals_recheck_seconds: int = 24 * 60 * 60
+    fundamentals_max_age_days: int = 90
+    # latest fiscal periods of a statement given to the tools, older ones stay stored but are not read
+    fundamentals_max_periods: int = 5
+    # daily price bars are stored as one parquet file per ticker, and new bars are checked for at most this often
+    price_store_dir: str = "app/backend/database/prices"
+    price_recheck_seconds: int = 15 * 60
+    # maximum number of companies fetched at the same time when comparing companies
+    batch_fetch_max_workers: int = 5
+    # where market data comes from: 'yfinance', 'replay' (recorded fixtures) or 'record' (yfinance, recorded to the fixtures)
+    market_data_provider: str = "yfinance"
+    market_data_fixtures_dir: str = "app/backend/benchmarks/fixtures"
+
+    # precomputed fundamentals of the S&P 500 constituents (see services/screener.py)
+    sp500_constituents_path: str = "data/sp500_companies_sector.csv"
+    screener_path: str = "app/backend/database/screener.parquet"
+    screener_max_workers: int = 8
+
+    # blocking agent tools run in a bounded thread pool so that they do not stall the event loop
+    tool_executor_max_workers: int = 16
+    # default number of calls of the same tool running at the same time, and how long a call may take
+    tool_max_concurrency: int = 8
+    # number of calls running at the same time of the tools that need another limit, by tool name: the CPU-bound
+    # Monte Carlo of the DCF sensitivity and the comparisons, which already fetch several companies per call
+    tool_concurrency: dict[str, int] = {
+        'get_dcf_sensitivity': 2,
+        'compare_financial_information': 4,
+    }
+    tool_timeout_seconds: float = 60.0
+    # tool outputs are given to the LLM as compact tables ('table') or as the raw dictionaries ('dict')
+    tool_output_format: str = "table"
+    tool_output_precision: int = 2
+    # longest horizon (in years) of the DCF sensitivity tool, whose grid and simulations grow with it
+    dcf_max_horizon: int = 50
+
+    # local cache of the web searches and pages of the tutor tools, and how long to trust each level
+    web_cache_db_url: str = "sqlite:///app/backend/database/web_cache.db"
+    web_search_cache_ttl_seconds: int = 7 * 24 * 60 * 60
+    web_page_cache_ttl_seconds: int = 30 * 24 * 60 * 60
+    # scraped articles are split into passages of at most this many characters, and only the most relevant ones are kept
+    passage_max_chars: int = 1000
+    passage_token_budget: int = 800
+
+    # offline knowledge index of investing concepts for the tutor (see services/knowledge_index.py)
+    knowledge_corpus_dir: str = "data/investing_concepts"
+    knowledge_index_dir: str = "app/backend/database/knowledge_index"
+    knowledge_top_k: int = 5
+    # passages less similar than this to the question are not relevant, and the tutor searches the web instead
+    knowledge_min_similarity: float = 0.45
+    knowledge_bm25_weight: float = 0.3
+
+    # shared keep-alive connection pools of the web tools: number of hosts kept, connections kept per host
+    http_pool_connections: int = 10
+    http_pool_maxsize: int = 20
+    http_max_retries: int = 2
+    http_timeout_seconds: float = 15.0
+
+    # identical news searches within the same time bucket share one upstream search
+    news_cache_bucket_seconds: int = 15 * 60
+    news_cache_max_size: int = 1024
+
+settings = Settings()
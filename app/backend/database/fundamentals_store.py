@@ -0,0 +1,147 @@
+import logging
+
+from datetime import datetime, timedelta
+import pandas as pd
+
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.backend.core.config import settings
+from app.backend.database.market_data import MarketDataSession, StatementValue, StatementRefresh, StripedLock
+from app.backend.services.market_data_provider import MarketDataProvider, get_market_data_provider
+
+logger = logging.getLogger(__name__)
+
+# a new annual period can only be available once a year has passed since the latest one
+FISCAL_PERIOD = timedelta(days=365)
+
+# durable store of the annual financial statements of companies, refreshed only when a new period might be available
+class FundamentalsStore:
+    def __init__(self, session_factory: sessionmaker = MarketDataSession, provider: MarketDataProvider = None):
+        self.session_factory = session_factory
+        # None means the provider of the app, looked up on every refresh
+        self.provider = provider
+        self.recheck_interval = timedelta(seconds=settings.fundamentals_recheck_seconds)
+        self.max_age = timedelta(days=settings.fundamentals_max_age_days)
+        self.max_periods = settings.fundamentals_max_periods
+        # only one refresh of the same statement at a time, the parallel tools often ask for the same ticker at once
+        self._locks = StripedLock()
+
+    def get_statement(self, ticker: str, statement: str) -> pd.DataFrame:
+        '''
+        Get a financial statement of a company, from the store if it is up to date, otherwise from upstream.
+        If upstream fails, the stored statement is returned even if it is out of date.
+
+        Args:
+            ticker (str): The ticker symbol of the company
+            statement (str): The statement to get, one of the statements in market_data_provider.STATEMENTS
+
+        Returns:
+            pd.DataFrame: The latest periods of the statement (settings.fundamentals_max_periods at most), indexed by
+                fiscal date (YYYY-MM-DD, latest first), with line items as columns
+        '''
+        ticker = ticker.strip().upper()
+        now = datetime.now()
+
+        with self._locks(f'{ticker}:{statement}'), self.session_factory() as db:
+            refresh = db.get(StatementRefresh, (ticker, statement))
+            if self.needs_refresh(refresh, now):
+                try:
+                    self._refresh(db, ticker, statement, now)
+                except Exception:
+                    if refresh is None:
+                        raise
+                    db.rollback()
+                    logger.warning("Could not refresh %s of %s, serving the stored statement", statement, ticker, exc_info=True)
+
+            return self._read(db, ticker, statement)
+
+    def needs_refresh(self, refresh: StatementRefresh, now: datetime) -> bool:
+        '''
+        Decide whether a statement has to be fetched from upstream again.
+
+        Args:
+            refresh (StatementRefresh): When the statement was last checked, or None if it was never stored
+            now (datetime): The current time
+
+        Returns:
+            bool: True if the statement is not stored, or if a new fiscal period might be available, or if it is too old
+        '''
+        if refresh is None:
+            return True
+        since_checked = now - refresh.last_checked
+        if since_checked < self.recheck_interval:
+            return False
+        if since_checked >= self.max_age or refresh.latest_fiscal_date is None:
+            return True
+        return now >= datetime.strptime(refresh.latest_fiscal_date, '%Y-%m-%d') + FISCAL_PERIOD
+
+    def _refresh(self, db: Session, ticker: str, statement: str, now: datetime):
+        '''Fetch a statement from upstream and store its periods, keeping older periods no longer returned upstream.'''
+        provider = self.provider or get_market_data_provider()
+        frame = provider.get_statement(ticker, statement)
+        fiscal_dates = []
+
+        if not frame.empty:
+            fiscal_dates = list(frame.index)
+
+            db.execute(
+                delete(StatementValue).where(
+                    StatementValue.ticker == ticker,
+                    StatementValue.statement == statement,
+                    StatementValue.fiscal_date.in_(fiscal_dates),
+                )
+            )
+            values = frame.reset_index(names='fiscal_date').melt(id_vars='fiscal_date', var_name='line_item')
+            values['value'] = pd.to_numeric(values['value'], errors='coerce')
+            db.add_all(
+                StatementValue(ticker=ticker, statement=statement, fiscal_date=fiscal_date, line_item=line_item, value=value)
+                for fiscal_date, line_item, value in values.dropna().itertuples(index=False)
+            )
+
+        # an empty answer (e.g. when rate limited) should not forget the latest period we already have
+        latest_fiscal_date = max(fiscal_dates, default=None)
+        previous = db.get(StatementRefresh, (ticker, statement))
+        if latest_fiscal_date is None and previous is not None:
+            latest_fiscal_date = previous.latest_fiscal_date
+
+        # upserted, since another process (e.g. the screener) may have stored the statement meanwhile
+        upsert = insert(StatementRefresh).values(
+            ticker=ticker,
+            statement=statement,
+            last_checked=now,
+            latest_fiscal_date=latest_fiscal_date,
+        )
+        db.execute(upsert.on_conflict_do_update(
+            index_elements=['ticker', 'statement'],
+            set_={'last_checked': upsert.excluded.last_checked, 'latest_fiscal_date': upsert.excluded.latest_fiscal_date}
+        ))
+        db.commit()
+
+    def _read(self, db: Session, ticker: str, statement: str) -> pd.DataFrame:
+        '''Read the latest periods of a stored statement back into the shape returned by yfinance (transposed).'''
+        of_statement = (StatementValue.ticker == ticker, StatementValue.statement == statement)
+        # periods no longer returned upstream are kept, but averages over the statement should only see the latest years
+        latest = (
+            select(StatementValue.fiscal_date).where(*of_statement).distinct()
+            .order_by(StatementValue.fiscal_date.desc()).limit(self.max_periods)
+        )
+        rows = db.execute(
+            select(StatementValue.fiscal_date, StatementValue.line_item, StatementValue.value).where(
+                *of_statement,
+                StatementValue.fiscal_date.in_(latest.scalar_subquery()),
+            )
+        ).all()
+
+        if not rows:
+            return pd.DataFrame(dtype='float64')
+
+        frame = pd.DataFrame(rows, columns=['fiscal_date', 'line_item', 'value'])
+        frame = frame.pivot(index='fiscal_date', columns='line_item', values='value').sort_index(ascending=False)
+        frame.index.name = None
+        frame.columns.name = None
+        return frame
+
+# one store shared by the whole app
+fundamentals_store = FundamentalsStore()
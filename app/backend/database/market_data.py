@@ -0,0 +1,92 @@
+# local database of market data fetched for the agent tools, kept apart from the app database
+
+import os
+
+from datetime import datetime
+from functools import lru_cache
+from threading import Lock
+
+from sqlalchemy import create_engine, make_url, String, Integer, Float, DateTime
+from sqlalchemy.engine import Engine
+
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import mapped_column
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import sessionmaker
+
+from app.backend.core.config import settings
+
+# define database schema
+class MarketDataBase(DeclarativeBase):
+    pass
+
+class StatementValue(MarketDataBase):
+    '''One line item of a financial statement of a company for one fiscal period.'''
+    __tablename__ = 'statement_values'
+    ticker: Mapped[str] = mapped_column(String(20), primary_key=True)
+    statement: Mapped[str] = mapped_column(String(30), primary_key=True)
+    fiscal_date: Mapped[str] = mapped_column(String(10), primary_key=True)
+    line_item: Mapped[str] = mapped_column(String(200), primary_key=True)
+    value: Mapped[float] = mapped_column(Float, nullable=True)
+
+class StatementRefresh(MarketDataBase):
+    '''When a financial statement of a company was last checked upstream, and the latest fiscal period it had.'''
+    __tablename__ = 'statement_refreshes'
+    ticker: Mapped[str] = mapped_column(String(20), primary_key=True)
+    statement: Mapped[str] = mapped_column(String(30), primary_key=True)
+    last_checked: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    latest_fiscal_date: Mapped[str] = mapped_column(String(10), nullable=True)
+
+class PriceRefresh(MarketDataBase):
+    '''When the price history of a company was last checked upstream, and its latest bar.'''
+    __tablename__ = 'price_refreshes'
+    ticker: Mapped[str] = mapped_column(String(20), primary_key=True)
+    last_checked: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    latest_date: Mapped[str] = mapped_column(String(10), nullable=True)
+    latest_close: Mapped[float] = mapped_column(Float, nullable=True)
+
+class YearEndClose(MarketDataBase):
+    '''The last close of a company in a calendar year.'''
+    __tablename__ = 'year_end_closes'
+    ticker: Mapped[str] = mapped_column(String(20), primary_key=True)
+    year: Mapped[int] = mapped_column(Integer, primary_key=True)
+    close: Mapped[float] = mapped_column(Float, nullable=False)
+
+# root of the repository, which the relative paths of the settings are relative to whatever the working directory
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+def project_path(path: str) -> str:
+    '''Resolve a path of the settings, relative paths being relative to the root of the repository.'''
+    return path if os.path.isabs(path) else os.path.join(PROJECT_ROOT, path)
+
+@lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    '''Get the engine of the market data database, creating the database and its tables on first use rather than on import.'''
+    url = make_url(settings.market_data_db_url)
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+        os.makedirs(os.path.dirname(project_path(url.database)), exist_ok=True)
+        url = url.set(database=project_path(url.database))
+
+    # the timeout lets the screener processes wait for each other's writes instead of failing
+    engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+    # create tables
+    MarketDataBase.metadata.create_all(engine)
+    return engine
+
+@lru_cache(maxsize=1)
+def _session_factory() -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+def MarketDataSession() -> Session:
+    '''Open a session on the market data database, used like a sessionmaker.'''
+    return _session_factory()()
+
+# fixed set of locks shared by the keys (e.g. tickers) that hash to the same one: the same key always gets the same lock,
+# and the memory does not grow with the keys ever seen
+class StripedLock:
+    def __init__(self, stripes: int = 64):
+        self.locks = [Lock() for _ in range(stripes)]
+
+    def __call__(self, key: str) -> Lock:
+        return self.locks[hash(key) % len(self.locks)]
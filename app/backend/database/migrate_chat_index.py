@@ -0,0 +1,150 @@
+'''
+Migrate the chat messages of the per-session vector indexes (one RediSearch index per user, named after the session)
+into the shared chat index, tagged with their session.
+
+The embeddings are copied as they are, so nothing is embedded again. The copies are under the key prefix of the
+shared index, so they are indexed by it whether it already exists or is only created by the app later.
+Every old index is dropped with its documents once its messages are copied, so running it again only migrates
+what is left, unless --keep-old is given (the messages are then copied again on every run).
+
+    python -m app.backend.database.migrate_chat_index --dry-run
+    python -m app.backend.database.migrate_chat_index
+'''
+import argparse
+import logging
+
+import redis
+
+from redis.commands.search.query import Query
+from ulid import ULID
+
+from app.backend.core.config import settings
+from app.backend.chatbot.ChatHistory import SESSION_KEYS_PREFIX
+
+logger = logging.getLogger(__name__)
+
+# fields of the documents of the old per-session indexes, as written by langchain-redis
+MESSAGE_FIELDS = {'text', 'embedding', 'sender'}
+
+def _decode(value) -> str:
+    return value.decode('utf-8') if isinstance(value, bytes) else str(value)
+
+def _index_fields(client: redis.Redis, index_name: str) -> set[str]:
+    info = client.ft(index_name).info()
+    fields = set()
+    for attribute in info.get('attributes', []):
+        # every attribute is a flat list of name/value pairs, e.g. [b'identifier', b'text', b'attribute', b'text', ...]
+        pairs = dict(zip(map(_decode, attribute[::2]), attribute[1::2]))
+        fields.add(_decode(pairs.get('attribute', pairs.get('identifier', ''))))
+    return fields
+
+def find_session_indexes(client: redis.Redis, shared_index: str = settings.chat_index_name) -> list[str]:
+    '''
+    Find the per-session chat indexes left from before the shared index.
+
+    Args:
+        client (redis.Redis): The Redis client
+        shared_index (str): The name of the shared chat index, which is not migrated
+
+    Returns:
+        list[str]: The names of the per-session indexes (the session ids)
+    '''
+    indexes = []
+    for name in map(_decode, client.execute_command('FT._LIST')):
+        if name == shared_index:
+            continue
+        # the per-session indexes hold exactly the chat message fields, other indexes (e.g. of the message history) are left alone
+        if _index_fields(client, name) == MESSAGE_FIELDS:
+            indexes.append(name)
+    return indexes
+
+def migrate_session_index(
+    client: redis.Redis,
+    session_id: str,
+    shared_index: str = settings.chat_index_name,
+    keep_old: bool = False,
+    batch_size: int = 500
+) -> int:
+    '''
+    Copy the messages of a per-session index into the shared index, then drop the per-session index.
+
+    Args:
+        client (redis.Redis): The Redis client
+        session_id (str): The session, which is also the name and the key prefix of its old index
+        shared_index (str): The name (and key prefix) of the shared chat index
+        keep_old (bool): Whether to keep the old index and its documents
+        batch_size (int): The number of messages copied per pipeline
+
+    Returns:
+        int: The number of messages copied
+    '''
+    copied = 0
+    keys = []
+
+    def flush():
+        nonlocal copied
+        pipe = client.pipeline(transaction=False)
+        for key in keys:
+            pipe.hgetall(key)
+        documents = pipe.execute()
+
+        pipe = client.pipeline(transaction=False)
+        new_keys = []
+        for document in documents:
+            if not document:
+                continue
+            mapping = {_decode(field): value for field, value in document.items()}
+            mapping['session_id'] = session_id
+            new_keys.append(f"{shared_index}:{ULID()}")
+            pipe.hset(new_keys[-1], mapping=mapping)
+        if new_keys:
+            # tracked like the messages written by the app, so that clearing the session finds them
+            pipe.sadd(f"{SESSION_KEYS_PREFIX}:{session_id}", *new_keys)
+        pipe.execute()
+        copied += len(new_keys)
+        keys.clear()
+
+    # the documents are listed through the old index itself, rather than by scanning the whole keyspace for every session
+    search = client.ft(session_id)
+    offset = 0
+    while True:
+        docs = search.search(Query('*').no_content().paging(offset, batch_size)).docs
+        if not docs:
+            break
+        keys.extend(doc.id for doc in docs)
+        flush()
+        offset += len(docs)
+
+    if not keep_old:
+        # drop the index with its documents, now that they are in the shared index
+        client.ft(session_id).dropindex(delete_documents=True)
+
+    return copied
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--redis-url', default=settings.redis_url)
+    parser.add_argument('--index', default=settings.chat_index_name, help='the shared chat index')
+    parser.add_argument('--keep-old', action='store_true', help='keep the per-session indexes and their documents')
+    parser.add_argument('--dry-run', action='store_true', help='only list the per-session indexes')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    client = redis.Redis.from_url(args.redis_url)
+
+    sessions = find_session_indexes(client, args.index)
+    logger.info("Found %d per-session indexes", len(sessions))
+    if args.dry_run:
+        for session_id in sessions:
+            logger.info("Would migrate %s", session_id)
+        return
+
+    total = 0
+    for session_id in sessions:
+        copied = migrate_session_index(client, session_id, args.index, args.keep_old)
+        total += copied
+        logger.info("Migrated %d messages of session %s", copied, session_id)
+    logger.info("Migrated %d messages of %d sessions into %s", total, len(sessions), args.index)
+
+if __name__ == '__main__':
+    main()
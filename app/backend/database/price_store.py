@@ -0,0 +1,171 @@
+import logging
+import os
+
+from datetime import datetime, timedelta
+
+import pandas as pd
+import numpy as np
+
+from sqlalchemy import select, delete
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.backend.core.config import settings
+from app.backend.database.market_data import MarketDataSession, PriceRefresh, YearEndClose, StripedLock, project_path
+from app.backend.services.market_data_provider import MarketDataProvider, get_market_data_provider
+
+logger = logging.getLogger(__name__)
+
+# local store of daily price bars (one parquet file per ticker), with the year-end and latest close kept as lookups
+class PriceStore:
+    def __init__(
+        self,
+        directory: str = None,
+        session_factory: sessionmaker = MarketDataSession,
+        provider: MarketDataProvider = None
+    ):
+        # None means settings.price_store_dir, read when the store is first used rather than on import
+        self._directory = directory
+        self.session_factory = session_factory
+        # None means the provider of the app, looked up on every refresh
+        self.provider = provider
+        self.recheck_interval = timedelta(seconds=settings.price_recheck_seconds)
+        # only one refresh of the same ticker at a time, so that appends are not lost
+        self._locks = StripedLock()
+
+    @property
+    def directory(self) -> str:
+        return project_path(self._directory or settings.price_store_dir)
+
+    def _path(self, ticker: str) -> str:
+        return os.path.join(self.directory, f'{ticker}.parquet')
+
+    def get_history(self, ticker: str) -> pd.DataFrame:
+        '''
+        Get the full daily price history of a company, fetching only the bars after the latest stored one.
+
+        Args:
+            ticker (str): The ticker symbol of the company
+
+        Returns:
+            pd.DataFrame: The daily bars, indexed by date
+        '''
+        ticker = self.refresh(ticker)
+        path = self._path(ticker)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=['Open', 'High', 'Low', 'Close', 'Volume'], dtype='float64')
+        return pd.read_parquet(path)
+
+    def get_year_end_close(self, ticker: str) -> pd.Series:
+        '''
+        Get the last close of every calendar year, without reading the price history.
+
+        Args:
+            ticker (str): The ticker symbol of the company
+
+        Returns:
+            pd.Series: The year-end close, with year as index
+        '''
+        ticker = self.refresh(ticker)
+        with self.session_factory() as db:
+            rows = db.execute(
+                select(YearEndClose.year, YearEndClose.close).where(YearEndClose.ticker == ticker).order_by(YearEndClose.year)
+            ).all()
+        return pd.Series(dict(rows), dtype='float64')
+
+    def get_latest_close(self, ticker: str) -> float:
+        '''
+        Get the latest close of a company, without reading the price history.
+
+        Args:
+            ticker (str): The ticker symbol of the company
+
+        Returns:
+            float: The latest close, or NaN if there are no prices for the company
+        '''
+        ticker = self.refresh(ticker)
+        with self.session_factory() as db:
+            refresh = db.get(PriceRefresh, ticker)
+            if refresh is None or refresh.latest_close is None:
+                return np.nan
+            return refresh.latest_close
+
+    def refresh(self, ticker: str) -> str:
+        '''
+        Fetch the bars of a company that are not stored yet, if it has not been checked recently.
+        If upstream fails, the stored bars are kept as they are.
+
+        Args:
+            ticker (str): The ticker symbol of the company
+
+        Returns:
+            str: The normalized ticker symbol
+        '''
+        ticker = ticker.strip().upper()
+        now = datetime.now()
+
+        with self._locks(ticker), self.session_factory() as db:
+            refresh = db.get(PriceRefresh, ticker)
+            if refresh is not None and now - refresh.last_checked < self.recheck_interval:
+                return ticker
+            try:
+                self._refresh(db, ticker, refresh, now)
+            except Exception:
+                if refresh is None:
+                    raise
+                db.rollback()
+                logger.warning("Could not refresh prices of %s, serving the stored bars", ticker, exc_info=True)
+
+        return ticker
+
+    def _refresh(self, db: Session, ticker: str, refresh: PriceRefresh, now: datetime):
+        '''Append the new bars of a company to its parquet file (or rewrite it if the history was adjusted) and update the lookups.'''
+        path = self._path(ticker)
+        provider = self.provider or get_market_data_provider()
+        stored = pd.read_parquet(path) if refresh is not None and refresh.latest_date and os.path.exists(path) else None
+
+        if stored is None or stored.empty:
+            bars = provider.get_price_history(ticker)
+            first_changed_year = None
+        else:
+            # refetch the latest stored bar as well: it may have been an intraday bar, and it tells us
+            # whether the history was adjusted (splits, dividends) since it was stored
+            new_bars = provider.get_price_history(ticker, start=refresh.latest_date)
+            overlap = stored.index[-1]
+            if overlap in new_bars.index and not np.isclose(new_bars.loc[overlap, 'Close'], stored.loc[overlap, 'Close']):
+                bars = provider.get_price_history(ticker)
+                first_changed_year = None
+            else:
+                new_bars = new_bars[new_bars.index >= overlap]
+                bars = pd.concat([stored[stored.index < new_bars.index[0]], new_bars]) if not new_bars.empty else stored
+                first_changed_year = overlap.year
+
+        latest_date = refresh.latest_date if refresh else None
+        latest_close = refresh.latest_close if refresh else None
+        if not bars.empty:
+            os.makedirs(self.directory, exist_ok=True)
+            bars.to_parquet(path)
+            self._index(db, ticker, bars, first_changed_year)
+            latest_date = bars.index[-1].strftime('%Y-%m-%d')
+            latest_close = float(bars['Close'].iloc[-1])
+
+        db.merge(PriceRefresh(ticker=ticker, last_checked=now, latest_date=latest_date, latest_close=latest_close))
+        db.commit()
+
+    def _index(self, db: Session, ticker: str, bars: pd.DataFrame, first_changed_year: int = None):
+        '''Update the year-end closes of the years that changed (all of them if first_changed_year is None).'''
+        if first_changed_year is not None:
+            bars = bars[bars.index.year >= first_changed_year]
+
+        year_end_close = bars['Close'].groupby(bars.index.year).last().dropna()
+
+        condition = [YearEndClose.ticker == ticker]
+        if first_changed_year is not None:
+            condition.append(YearEndClose.year >= first_changed_year)
+        db.execute(delete(YearEndClose).where(*condition))
+        db.add_all(
+            YearEndClose(ticker=ticker, year=int(year), close=float(close))
+            for year, close in year_end_close.items()
+        )
+
+# one store shared by the whole app
+price_store = PriceStore()
@@ -0,0 +1,168 @@
+# local cache of web searches and scraped pages for the tutor tools, kept apart from the app database
+
+import hashlib
+import logging
+import os
+import re
+
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Callable
+
+from sqlalchemy import create_engine, make_url, String, Text, DateTime
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.engine import Engine
+
+from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import Mapped
+from sqlalchemy.orm import mapped_column
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import sessionmaker
+
+from app.backend.core.config import settings
+from app.backend.database.market_data import project_path
+
+logger = logging.getLogger(__name__)
+
+# define database schema
+class WebCacheBase(DeclarativeBase):
+    pass
+
+class SearchResult(WebCacheBase):
+    '''The page found for a normalized search query.'''
+    __tablename__ = 'search_results'
+    query: Mapped[str] = mapped_column(String(500), primary_key=True)
+    url: Mapped[str] = mapped_column(String(2000), nullable=False)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+class PageContent(WebCacheBase):
+    '''The text extracted from a page, with its hash to tell whether it changed when fetched again.'''
+    __tablename__ = 'page_contents'
+    url: Mapped[str] = mapped_column(String(2000), primary_key=True)
+    content: Mapped[str] = mapped_column(Text, nullable=False)
+    content_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    fetched_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+@lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    '''Get the engine of the web cache database, creating the database and its tables on first use rather than on import.'''
+    url = make_url(settings.web_cache_db_url)
+    if url.get_backend_name() == 'sqlite' and url.database and url.database != ':memory:':
+        os.makedirs(os.path.dirname(project_path(url.database)), exist_ok=True)
+        url = url.set(database=project_path(url.database))
+
+    engine = create_engine(url, connect_args={"check_same_thread": False, "timeout": 30})
+    # create tables
+    WebCacheBase.metadata.create_all(engine)
+    return engine
+
+@lru_cache(maxsize=1)
+def _session_factory() -> sessionmaker:
+    return sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+
+def WebCacheSession() -> Session:
+    '''Open a session on the web cache database, used like a sessionmaker.'''
+    return _session_factory()()
+
+def normalize_query(query: str) -> str:
+    '''Normalize a search query so that the same question asked differently (case, spacing, punctuation) hits the cache.'''
+    return ' '.join(re.findall(r'\w+', query.lower()))
+
+def content_hash(content: str) -> str:
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+# two-level cache: normalized query -> url, and url -> extracted text, each entry trusted for a time to live
+class WebCache:
+    def __init__(self, session_factory: sessionmaker = WebCacheSession):
+        self.session_factory = session_factory
+        self.search_ttl = timedelta(seconds=settings.web_search_cache_ttl_seconds)
+        self.page_ttl = timedelta(seconds=settings.web_page_cache_ttl_seconds)
+
+    def _store(self, db, table, values: dict, columns: list[str]):
+        '''Insert or update a cache entry in one statement, so that concurrent misses of the same key do not conflict.'''
+        try:
+            statement = insert(table).values(**values)
+            db.execute(statement.on_conflict_do_update(
+                index_elements=[column.name for column in table.__table__.primary_key],
+                set_={column: getattr(statement.excluded, column) for column in columns}
+            ))
+            db.commit()
+        except Exception:
+            # the cache is an optimization, the tool still has its result when it cannot be stored
+            db.rollback()
+            logger.warning("Could not write the web cache", exc_info=True)
+
+    def get_url(self, query: str, search: Callable[[str], str]) -> str:
+        '''
+        Get the url of the page found for a query, from the cache if it is fresh, otherwise by searching.
+        If the search fails, the cached url is returned even if it is out of date.
+
+        Args:
+            query (str): The query in natural language
+            search (Callable[[str], str]): Searches for the query and returns the url of the best result
+
+        Returns:
+            str: The url of the page
+        '''
+        key = normalize_query(query)
+        now = datetime.now()
+
+        with self.session_factory() as db:
+            cached = db.get(SearchResult, key)
+            if cached is not None and now - cached.fetched_at < self.search_ttl:
+                return cached.url
+
+            try:
+                url = search(query)
+            except Exception:
+                if cached is None:
+                    raise
+                logger.warning("Could not search for %r, serving the cached result", query, exc_info=True)
+                return cached.url
+
+            self._store(db, SearchResult, {'query': key, 'url': url, 'fetched_at': now}, ['url', 'fetched_at'])
+            return url
+
+    def get_page(self, url: str, load: Callable[[str], str]) -> str:
+        '''
+        Get the text of a page, from the cache if it is fresh, otherwise by loading the page.
+        If loading fails, the cached text is returned even if it is out of date.
+
+        Args:
+            url (str): The url of the page
+            load (Callable[[str], str]): Downloads the page and returns its extracted text
+
+        Returns:
+            str: The text of the page
+        '''
+        now = datetime.now()
+
+        with self.session_factory() as db:
+            cached = db.get(PageContent, url)
+            if cached is not None and now - cached.fetched_at < self.page_ttl:
+                return cached.content
+
+            try:
+                content = load(url)
+            except Exception:
+                if cached is None:
+                    raise
+                logger.warning("Could not load %s, serving the cached page", url, exc_info=True)
+                return cached.content
+
+            # a page without text (e.g. rendered by javascript) is not cached, in case it has text next time
+            if not content.strip():
+                if cached is not None:
+                    logger.warning("No text in %s, serving the cached page", url)
+                    return cached.content
+                return content
+
+            digest = content_hash(content)
+            values = {'url': url, 'content': content, 'content_hash': digest, 'fetched_at': now}
+            # an unchanged page is only trusted for longer, its text is not written again
+            unchanged = cached is not None and cached.content_hash == digest
+            self._store(db, PageContent, values, ['fetched_at'] if unchanged else ['content', 'content_hash', 'fetched_at'])
+            return content
+
+# one cache shared by the whole app
+web_cache = WebCache()
@@ -2,11 +2,16 @@ from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 
 from app.backend.api.endpoints.v1 import router
 from app.backend.core.config import settings
 
 from app.backend.services.session_manager import SessionManager
+from app.backend.services.http_clients import HttpClients, set_http_clients
+from app.backend.services.redis_pool import RedisPool, set_redis_pool
+from app.backend.services.persistence_queue import PersistenceQueue, set_persistence_queue
+from app.backend.services.knowledge_index import load_knowledge_index, set_knowledge_index
 from app.backend.chatbot.InvestingChatBot import InvestingChatBot
 from app.backend.speech_to_text.speech_to_text import SpeechToText
 
@@ -19,8 +24,25 @@ load_dotenv()
 async def lifespan(app: FastAPI):
     # load state variables
 
+    # create the Redis connection pools shared by all chat sessions
+    app.state.redis_pool = RedisPool()
+    set_redis_pool(app.state.redis_pool)
+
+    # create the queue writing the chat turns of all sessions behind, in batches
+    app.state.persistence_queue = PersistenceQueue()
+    set_persistence_queue(app.state.persistence_queue)
+
+    # create the HTTP connection pools shared by the web tools, before the agents that use them
+    app.state.http_clients = HttpClients()
+    set_http_clients(app.state.http_clients)
+
     # create a global instance of the session manager
     app.state.session_manager = SessionManager()
+    # attach to (or create) the chat index now, in a thread, rather than with the blocking client on the event loop of the first chat
+    await run_in_threadpool(lambda: app.state.session_manager.vector_store)
+
+    # load the offline knowledge index of the tutor, with the embedding model of the sessions
+    set_knowledge_index(load_knowledge_index(embeddings=app.state.session_manager.embeddings))
 
     # create global instance of bot, which is stateless and can be shared across sessions
     app.state.bot = InvestingChatBot()
@@ -30,10 +52,17 @@ async def lifespan(app: FastAPI):
     
     yield
 
-    # clean up and release the resources
+    # clean up and release the resources, writing the queued chat turns while Redis is still there
+    await app.state.persistence_queue.close()
+    del app.state.persistence_queue
     del app.state.session_manager
     del app.state.bot
     del app.state.speech_to_text_service
+    app.state.http_clients.close()
+    del app.state.http_clients
+    set_knowledge_index(None)
+    await app.state.redis_pool.aclose()
+    del app.state.redis_pool
 
 # declare origins for CORS
 origins = [
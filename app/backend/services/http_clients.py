@@ -0,0 +1,118 @@
+import requests
+
+from threading import Lock
+
+from langchain_community.document_loaders.web_base import default_header_template
+from langchain_tavily import TavilySearch
+from langchain_tavily._utilities import TavilySearchAPIWrapper, TAVILY_API_URL
+from pydantic import PrivateAttr
+from requests.adapters import HTTPAdapter
+
+from app.backend.core.config import settings
+
+# Tavily search API wrapper sending its requests through a shared keep-alive session,
+# instead of a new connection (and TLS handshake) for every search
+class PooledTavilySearchAPIWrapper(TavilySearchAPIWrapper):
+    _session: requests.Session = PrivateAttr()
+
+    def __init__(self, session: requests.Session, **kwargs):
+        super().__init__(**kwargs)
+        self._session = session
+
+    def raw_results(self, query: str, **kwargs) -> dict:
+        params = {key: value for key, value in {'query': query, **kwargs}.items() if value is not None}
+        headers = {
+            "Authorization": f"Bearer {self.tavily_api_key.get_secret_value()}",
+            "Content-Type": "application/json",
+            "X-Client-Source": "langchain-tavily",
+        }
+        response = self._session.post(
+            f"{self.api_base_url or TAVILY_API_URL}/search",
+            json=params,
+            headers=headers,
+            timeout=settings.http_timeout_seconds,
+        )
+        if response.status_code != 200:
+            detail = response.json().get("detail", {})
+            error_message = detail.get("error") if isinstance(detail, dict) else "Unknown error"
+            raise ValueError(f"Error {response.status_code}: {error_message}")
+        return response.json()
+
+    async def raw_results_async(self, query: str, **kwargs) -> dict:
+        # the pooled session is blocking, so run it in the tool thread pool rather than opening an aiohttp session per search
+        from app.backend.chatbot.tool_executor import run_blocking
+
+        return await run_blocking('tavily_search', self.raw_results, query, **kwargs)
+
+# application-wide HTTP layer: one keep-alive connection pool per host, shared by the web search and page loading tools
+class HttpClients:
+    def __init__(
+        self,
+        pool_connections: int = settings.http_pool_connections,
+        pool_maxsize: int = settings.http_pool_maxsize,
+        max_retries: int = settings.http_max_retries
+    ):
+        self.adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=max_retries)
+
+        self.session = requests.Session()
+        self.session.mount('http://', self.adapter)
+        self.session.mount('https://', self.adapter)
+        # the pages are loaded as WebBaseLoader would load them with its own session
+        self.session.headers.update(default_header_template)
+
+        self.tavily = PooledTavilySearchAPIWrapper(self.session)
+
+    def tavily_search(self, **kwargs) -> TavilySearch:
+        '''
+        Create a Tavily search tool whose searches go through the shared connection pool.
+
+        Args:
+            **kwargs: The parameters of the TavilySearch tool, e.g. max_results
+
+        Returns:
+            TavilySearch: The search tool
+        '''
+        return TavilySearch(api_wrapper=self.tavily, **kwargs)
+
+    def stats(self) -> dict:
+        '''
+        Get the statistics of the connection pools.
+
+        Returns:
+            dict: Host -> the connections opened, the requests sent and the idle connections kept alive
+        '''
+        stats = {}
+        pools = self.adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats[f'{key.key_scheme}://{key.key_host}'] = {
+                'connections_opened': pool.num_connections,
+                'requests': pool.num_requests,
+                # every request beyond the first one of a connection reused a kept alive connection
+                'reused': max(pool.num_requests - pool.num_connections, 0),
+                # the pool queue is padded with None up to its size, the rest are open connections
+                'idle_connections': sum(conn is not None for conn in list(pool.pool.queue)) if pool.pool is not None else 0,
+            }
+        return stats
+
+    def close(self):
+        self.session.close()
+
+_clients = None
+_clients_lock = Lock()
+
+def get_http_clients() -> HttpClients:
+    '''Get the HTTP clients used by the whole app, creating them on first use (e.g. outside of the app).'''
+    global _clients
+    with _clients_lock:
+        if _clients is None:
+            _clients = HttpClients()
+        return _clients
+
+def set_http_clients(clients: HttpClients):
+    '''Replace the HTTP clients used by the whole app, e.g. by the ones created in the app lifespan.'''
+    global _clients
+    with _clients_lock:
+        _clients = clients
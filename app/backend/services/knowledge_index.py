@@ -0,0 +1,291 @@
+'''
+Offline knowledge index of investing-concept articles for the TutorAgent.
+
+The articles are read from a local corpus directory (one .md, .txt or .html file per article), split into passages,
+and indexed both for BM25 and with sentence embeddings, so that concept questions are answered from disk
+instead of a web search and a scrape. A markdown or text article may start with a "source: <url>" line
+to give the link to cite; otherwise the file path is cited.
+
+Build (or rebuild) the index with: python -m app.backend.services.knowledge_index
+'''
+import argparse
+import json
+import logging
+import os
+import re
+
+from collections import Counter, defaultdict
+from threading import Lock
+
+import numpy as np
+import pandas as pd
+
+from app.backend.core.config import settings
+from app.backend.chatbot.passage_ranker import HEADING_PREFIX, article_text, iter_passages, tokenize
+from app.backend.chatbot.embedding_backends import embedding_namespace, get_embeddings
+
+logger = logging.getLogger(__name__)
+
+CORPUS_EXTENSIONS = ('.md', '.txt', '.html', '.htm')
+
+SOURCE_PATTERN = re.compile(r'^\s*source:\s*(\S+)\s*$', re.IGNORECASE)
+MARKDOWN_HEADING_PATTERN = re.compile(r'^#{1,6}\s+')
+
+def _create_embeddings():
+    # the model of the chat history, loaded once per process and behind the embedding cache
+    return get_embeddings()
+
+def _namespace(embeddings) -> str:
+    # the name of the model, as cached by CachedEmbeddings, or of the configured backend for a bare model
+    return getattr(embeddings, 'namespace', None) or embedding_namespace()
+
+def read_article(path: str) -> tuple[str, str, str]:
+    '''
+    Read an article of the corpus.
+
+    Args:
+        path (str): The file of the article
+
+    Returns:
+        tuple[str, str, str]: The title, the source to cite, and the text with one heading or paragraph per line
+    '''
+    with open(path, encoding='utf-8') as f:
+        raw = f.read()
+
+    title = os.path.splitext(os.path.basename(path))[0].replace('_', ' ').replace('-', ' ')
+    source = path
+
+    if path.endswith(('.html', '.htm')):
+        from bs4 import BeautifulSoup, SoupStrainer
+
+        soup = BeautifulSoup(raw, 'html.parser', parse_only=SoupStrainer(name=['title', 'h1', 'h2', 'p']))
+        heading = soup.find(['title', 'h1'])
+        if heading is not None and heading.get_text(strip=True):
+            title = heading.get_text(' ', strip=True)
+        return title, source, article_text(soup.find_all(['h2', 'p']))
+
+    lines = raw.splitlines()
+    if lines and SOURCE_PATTERN.match(lines[0]):
+        source = SOURCE_PATTERN.match(lines[0]).group(1)
+        lines = lines[1:]
+
+    text = []
+    for line in lines:
+        if MARKDOWN_HEADING_PATTERN.match(line):
+            if line.startswith('# ') and not text:
+                # the top heading is the title of the article
+                title = line[2:].strip()
+                continue
+            line = HEADING_PREFIX + MARKDOWN_HEADING_PATTERN.sub('', line).strip()
+        text.append(line)
+
+    return title, source, '\n'.join(text)
+
+def build_knowledge_index(
+    corpus_dir: str = settings.knowledge_corpus_dir,
+    output_dir: str = settings.knowledge_index_dir,
+    embeddings=None
+) -> pd.DataFrame:
+    '''
+    Chunk the articles of the corpus into passages, embed them and save the index.
+
+    Args:
+        corpus_dir (str): The directory of the articles, searched recursively
+        output_dir (str): Where to save the index
+        embeddings: The embedding model, defaults to the one of the chat history
+
+    Returns:
+        pd.DataFrame: The indexed passages, with their title and source
+    '''
+    rows = []
+    for root, _, files in os.walk(corpus_dir):
+        for name in sorted(files):
+            if not name.lower().endswith(CORPUS_EXTENSIONS):
+                continue
+            title, source, text = read_article(os.path.join(root, name))
+            for passage in iter_passages(text):
+                rows.append({'title': title, 'source': source, 'text': passage})
+
+    if not rows:
+        raise ValueError(f"No articles found in {corpus_dir}")
+
+    chunks = pd.DataFrame(rows)
+    embeddings = embeddings or _create_embeddings()
+    # the title is embedded with the passage, since a passage rarely names the concept it is about
+    vectors = np.asarray(
+        embeddings.embed_documents([f"{title}\n{text}" for title, text in zip(chunks['title'], chunks['text'])]),
+        dtype='float32'
+    )
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+    os.makedirs(output_dir, exist_ok=True)
+    chunks.to_parquet(os.path.join(output_dir, 'chunks.parquet'), index=False)
+    np.save(os.path.join(output_dir, 'embeddings.npy'), vectors)
+    # the model the passages were embedded with, checked when the index is loaded
+    with open(os.path.join(output_dir, 'embedding.json'), 'w', encoding='utf-8') as f:
+        json.dump({'model': _namespace(embeddings), 'dimension': int(vectors.shape[1])}, f)
+
+    return chunks
+
+# hybrid BM25 and embedding retrieval over the passages of the knowledge index, held in memory
+class KnowledgeIndex:
+    def __init__(self, chunks: pd.DataFrame, vectors: np.ndarray, embeddings, k1: float = 1.5, b: float = 0.75):
+        self.chunks = chunks.reset_index(drop=True)
+        self.vectors = vectors
+        self.embeddings = embeddings
+        self.k1 = k1
+        self.b = b
+
+        # inverted index of the passages: term -> (passage ids, term frequencies)
+        postings = defaultdict(lambda: ([], []))
+        lengths = []
+        for i, (title, text) in enumerate(zip(self.chunks['title'], self.chunks['text'])):
+            tokens = tokenize(f"{title}\n{text}")
+            lengths.append(len(tokens))
+            for term, frequency in Counter(tokens).items():
+                postings[term][0].append(i)
+                postings[term][1].append(frequency)
+
+        self.postings = {
+            term: (np.array(ids), np.array(frequencies, dtype='float64'))
+            for term, (ids, frequencies) in postings.items()
+        }
+        self.lengths = np.array(lengths, dtype='float64')
+        self.average_length = max(self.lengths.mean(), 1) if len(lengths) else 1
+
+    @classmethod
+    def load(cls, directory: str = settings.knowledge_index_dir, embeddings=None) -> 'KnowledgeIndex':
+        '''
+        Load a knowledge index saved by build_knowledge_index.
+
+        Args:
+            directory (str): The directory of the index
+            embeddings: The embedding model used to build the index, defaults to the one of the chat history
+
+        Returns:
+            KnowledgeIndex: The index
+
+        Raises:
+            ValueError: If the index was built with an embedding model of another dimension than the given one
+        '''
+        chunks = pd.read_parquet(os.path.join(directory, 'chunks.parquet'))
+        vectors = np.load(os.path.join(directory, 'embeddings.npy'))
+        embeddings = embeddings or _create_embeddings()
+
+        # fail at startup rather than on the first question, when the query vector does not fit the passage vectors
+        path = os.path.join(directory, 'embedding.json')
+        built_with = f"a model of dimension {vectors.shape[1]}"
+        if os.path.exists(path):
+            with open(path, encoding='utf-8') as f:
+                built_with = json.load(f)['model']
+        dimension = len(embeddings.embed_query('dimension')) if len(vectors) else vectors.shape[1]
+        if dimension != vectors.shape[1]:
+            raise ValueError(
+                f"The knowledge index in {directory} was built with {built_with} ({vectors.shape[1]} dimensions), "
+                f"but the embedding model gives {dimension}; rebuild it with: python -m app.backend.services.knowledge_index"
+            )
+        if os.path.exists(path) and built_with != _namespace(embeddings):
+            # e.g. the full model and its int8 version, whose vectors are close enough
+            logger.warning("The knowledge index was built with %s and is searched with %s", built_with, _namespace(embeddings))
+
+        return cls(chunks, vectors, embeddings)
+
+    def bm25(self, query: str) -> np.ndarray:
+        '''BM25 score of every passage for a query.'''
+        scores = np.zeros(len(self.chunks))
+        n = len(self.chunks)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            ids, frequencies = self.postings[term]
+            idf = np.log((n - len(ids) + 0.5) / (len(ids) + 0.5) + 1)
+            norm = self.k1 * (1 - self.b + self.b * self.lengths[ids] / self.average_length)
+            scores[ids] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+        return scores
+
+    def search(
+        self,
+        query: str,
+        k: int = settings.knowledge_top_k,
+        min_similarity: float = settings.knowledge_min_similarity,
+        bm25_weight: float = settings.knowledge_bm25_weight
+    ) -> list[dict]:
+        '''
+        Find the passages most relevant to a query.
+
+        Args:
+            query (str): The question of the user
+            k (int): The maximum number of passages to return
+            min_similarity (float): The minimum cosine similarity of a passage to the query to count as relevant
+            bm25_weight (float): The weight of the (max-normalized) BM25 score against the cosine similarity
+
+        Returns:
+            list[dict]: The relevant passages, best first, with their title, source, text and score. Empty if none is relevant.
+        '''
+        if not len(self.chunks):
+            return []
+
+        vector = np.asarray(self.embeddings.embed_query(query), dtype='float32')
+        similarity = self.vectors @ (vector / max(np.linalg.norm(vector), 1e-12))
+
+        bm25 = self.bm25(query)
+        if bm25.max() > 0:
+            bm25 = bm25 / bm25.max()
+
+        scores = bm25_weight * bm25 + (1 - bm25_weight) * similarity
+        # only passages close enough in meaning count, keyword matches alone are not enough
+        candidates = np.flatnonzero(similarity >= min_similarity)
+        best = candidates[np.argsort(-scores[candidates], kind='stable')][:k]
+
+        return [
+            {
+                'title': self.chunks.at[i, 'title'],
+                'source': self.chunks.at[i, 'source'],
+                'text': self.chunks.at[i, 'text'],
+                'score': round(float(scores[i]), 4),
+            }
+            for i in best
+        ]
+
+_index = None
+_index_lock = Lock()
+
+def load_knowledge_index(directory: str = settings.knowledge_index_dir, embeddings=None) -> KnowledgeIndex:
+    '''
+    Load the knowledge index of the app, if it was built.
+
+    Args:
+        directory (str): The directory of the index
+        embeddings: The embedding model used to build the index, defaults to the one of the chat history
+
+    Returns:
+        KnowledgeIndex: The index, or None if it was not built, in which case the tutor tools search the web
+    '''
+    if not os.path.exists(os.path.join(directory, 'chunks.parquet')):
+        logger.warning("No knowledge index in %s, the tutor will search the web for every question", directory)
+        return None
+    return KnowledgeIndex.load(directory, embeddings)
+
+def get_knowledge_index() -> KnowledgeIndex:
+    '''Get the knowledge index used by the whole app, or None if it is not loaded.'''
+    with _index_lock:
+        return _index
+
+def set_knowledge_index(index: KnowledgeIndex):
+    '''Set the knowledge index used by the whole app, e.g. the one loaded in the app lifespan.'''
+    global _index
+    with _index_lock:
+        _index = index
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--corpus', default=settings.knowledge_corpus_dir)
+    parser.add_argument('--output', default=settings.knowledge_index_dir)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    chunks = build_knowledge_index(args.corpus, args.output)
+    logger.info("Indexed %d passages of %d articles into %s", len(chunks), chunks['source'].nunique(), args.output)
+
+if __name__ == '__main__':
+    main()
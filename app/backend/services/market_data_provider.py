@@ -0,0 +1,173 @@
+import json
+import os
+
+from abc import ABC, abstractmethod
+from threading import Lock
+
+import yfinance as yf
+
+import pandas as pd
+
+from app.backend.core.config import settings
+
+# annual statements a provider can return
+STATEMENTS = ('balance_sheet', 'income_statement', 'cash_flow')
+
+# Base class for all sources of market data used by the agent tools
+class MarketDataProvider(ABC):
+    @abstractmethod
+    def get_statement(self, ticker: str, statement: str) -> pd.DataFrame:
+        '''
+        Get an annual financial statement of a company.
+
+        Args:
+            ticker (str): The ticker symbol of the company
+            statement (str): The statement to get, one of STATEMENTS
+
+        Returns:
+            pd.DataFrame: The statement indexed by fiscal date (YYYY-MM-DD, latest first), with line items as columns
+        '''
+        pass
+
+    @abstractmethod
+    def get_info(self, ticker: str) -> dict:
+        '''
+        Get the company profile and key statistics of a company.
+
+        Args:
+            ticker (str): The ticker symbol of the company
+
+        Returns:
+            dict: The company profile and key statistics
+        '''
+        pass
+
+    @abstractmethod
+    def get_price_history(self, ticker: str, start: str = None) -> pd.DataFrame:
+        '''
+        Get the daily price bars of a company.
+
+        Args:
+            ticker (str): The ticker symbol of the company
+            start (str): The first date (YYYY-MM-DD) to get bars from, or None for the full history
+
+        Returns:
+            pd.DataFrame: The daily bars (Open, High, Low, Close, Volume, ...), indexed by date
+        '''
+        pass
+
+# provider getting live data from Yahoo Finance
+class YFinanceProvider(MarketDataProvider):
+    def get_statement(self, ticker: str, statement: str) -> pd.DataFrame:
+        stock = yf.Ticker(ticker)
+        frame = {
+            'balance_sheet': lambda: stock.balance_sheet,
+            'income_statement': lambda: stock.income_stmt,
+            'cash_flow': lambda: stock.cash_flow,
+        }[statement]()
+
+        if frame.empty:
+            return pd.DataFrame(dtype='float64')
+
+        frame = frame.transpose()
+        frame.index = frame.index.strftime('%Y-%m-%d')
+        return frame
+
+    def get_info(self, ticker: str) -> dict:
+        return yf.Ticker(ticker).info
+
+    def get_price_history(self, ticker: str, start: str = None) -> pd.DataFrame:
+        stock = yf.Ticker(ticker)
+        if start is None:
+            return stock.history(period='max')
+        return stock.history(start=start)
+
+# provider replaying market data recorded on disk, to measure the agent tools without the network
+# layout: <directory>/<TICKER>/{balance_sheet,income_statement,cash_flow,prices}.parquet and info.json
+class ReplayProvider(MarketDataProvider):
+    def __init__(self, directory: str = settings.market_data_fixtures_dir):
+        self.directory = directory
+
+    def _path(self, ticker: str, name: str) -> str:
+        path = os.path.join(self.directory, ticker.strip().upper(), name)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No recorded market data at {path}")
+        return path
+
+    def get_statement(self, ticker: str, statement: str) -> pd.DataFrame:
+        return pd.read_parquet(self._path(ticker, f'{statement}.parquet'))
+
+    def get_info(self, ticker: str) -> dict:
+        with open(self._path(ticker, 'info.json')) as f:
+            return json.load(f)
+
+    def get_price_history(self, ticker: str, start: str = None) -> pd.DataFrame:
+        prices = pd.read_parquet(self._path(ticker, 'prices.parquet'))
+        if start is not None:
+            prices = prices[prices.index >= pd.Timestamp(start, tz=prices.index.tz)]
+        return prices
+
+# provider recording what another provider returns, in the layout read by ReplayProvider
+class RecordingProvider(MarketDataProvider):
+    def __init__(self, provider: MarketDataProvider, directory: str = settings.market_data_fixtures_dir):
+        self.provider = provider
+        self.directory = directory
+
+    def _path(self, ticker: str, name: str) -> str:
+        directory = os.path.join(self.directory, ticker.strip().upper())
+        os.makedirs(directory, exist_ok=True)
+        return os.path.join(directory, name)
+
+    def get_statement(self, ticker: str, statement: str) -> pd.DataFrame:
+        frame = self.provider.get_statement(ticker, statement)
+        # parquet needs string column names and a single type per column
+        frame.astype('float64').to_parquet(self._path(ticker, f'{statement}.parquet'))
+        return frame
+
+    def get_info(self, ticker: str) -> dict:
+        info = self.provider.get_info(ticker)
+        with open(self._path(ticker, 'info.json'), 'w') as f:
+            json.dump(info, f, default=str)
+        return info
+
+    def get_price_history(self, ticker: str, start: str = None) -> pd.DataFrame:
+        prices = self.provider.get_price_history(ticker, start)
+        # only a full history can be replayed for any start date
+        if start is None:
+            prices.to_parquet(self._path(ticker, 'prices.parquet'))
+        return prices
+
+def create_market_data_provider(name: str = settings.market_data_provider) -> MarketDataProvider:
+    '''
+    Create the market data provider selected in the settings.
+
+    Args:
+        name (str): 'yfinance' for live data, 'replay' to serve recorded data, or 'record' to record live data while serving it
+
+    Returns:
+        MarketDataProvider: The market data provider
+    '''
+    if name == 'yfinance':
+        return YFinanceProvider()
+    if name == 'replay':
+        return ReplayProvider()
+    if name == 'record':
+        return RecordingProvider(YFinanceProvider())
+    raise ValueError(f"Unknown market data provider: {name}")
+
+_provider = None
+_provider_lock = Lock()
+
+def get_market_data_provider() -> MarketDataProvider:
+    '''Get the market data provider used by the whole app, creating it on first use.'''
+    global _provider
+    with _provider_lock:
+        if _provider is None:
+            _provider = create_market_data_provider()
+        return _provider
+
+def set_market_data_provider(provider: MarketDataProvider):
+    '''Replace the market data provider used by the whole app, e.g. to benchmark against recorded data.'''
+    global _provider
+    with _provider_lock:
+        _provider = provider
@@ -0,0 +1,142 @@
+import asyncio
+import hashlib
+import re
+import time
+
+from functools import lru_cache
+from typing import Awaitable, Callable
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from cachetools import TTLCache
+
+from app.backend.core.config import settings
+from app.backend.database.web_cache import normalize_query
+from app.backend.services.http_clients import HttpClients, get_http_clients
+
+@lru_cache(maxsize=1)
+def _news_search_tool(clients: HttpClients):
+    # built once per set of HTTP clients rather than on every search
+    return clients.tavily_search(
+        api_key="TAVILY_API_KEY",
+        search_type="news",
+        topic="news",
+        language="en",
+        max_results=5,
+        sort_by="relevancy",
+    )
+
+async def _tavily_news(query: str) -> dict:
+    return await _news_search_tool(get_http_clients()).ainvoke({'query': query})
+
+def canonical_url(url: str) -> str:
+    '''Normalize a url so that the same article linked differently (scheme case, www, tracking parameters, trailing slash) is recognized.'''
+    parts = urlsplit(url.strip())
+    netloc = parts.netloc.lower().removeprefix('www.')
+    query = urlencode([(key, value) for key, value in parse_qsl(parts.query) if not key.lower().startswith('utm_')])
+    return urlunsplit(('https', netloc, parts.path.rstrip('/'), query, ''))
+
+def _content_hash(content: str) -> str:
+    # syndicated articles (e.g. wire stories) have the same text under different urls
+    normalized = re.sub(r'\s+', ' ', content or '').strip().lower()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+def deduplicate(results: list[dict]) -> list[dict]:
+    '''
+    Remove the articles already seen under the same url or with the same content, keeping the first (most relevant) one.
+
+    Args:
+        results (list[dict]): The search results, each with at least a 'url' and a 'content'
+
+    Returns:
+        list[dict]: The unique results, in the same order
+    '''
+    urls, hashes, unique = set(), set(), []
+    for result in results:
+        url = canonical_url(result.get('url', ''))
+        digest = _content_hash(result.get('content', ''))
+        if url in urls or (result.get('content') and digest in hashes):
+            continue
+        urls.add(url)
+        hashes.add(digest)
+        unique.append(result)
+    return unique
+
+# front-end of the news searches of the SearchAgent: identical searches within a time bucket cost one upstream call,
+# whether they arrive at the same time (coalesced into the call in flight) or later (served from the cache)
+class NewsSearch:
+    def __init__(
+        self,
+        search: Callable[[str], Awaitable[dict]] = _tavily_news,
+        bucket_seconds: int = settings.news_cache_bucket_seconds,
+        max_size: int = settings.news_cache_max_size
+    ):
+        self.search_upstream = search
+        self.bucket_seconds = bucket_seconds
+        # an entry is only used within its bucket, so it does not have to live longer than one
+        self.cache = TTLCache(maxsize=max_size, ttl=bucket_seconds)
+        self.in_flight: dict[tuple, asyncio.Task] = {}
+        self.stats = {
+            'searches': 0,
+            'cache_hits': 0,
+            'coalesced': 0,
+            'upstream_calls': 0,
+            'duplicates_removed': 0,
+        }
+
+    async def search(self, query: str) -> dict:
+        '''
+        Search for news articles about a query.
+
+        Args:
+            query (str): The query in natural language
+
+        Returns:
+            dict: The query and the unique articles found, each with its title, url, content and publication date
+        '''
+        # every search of the same query within the same bucket shares the same key
+        key = (normalize_query(query), int(time.time() // self.bucket_seconds))
+        self.stats['searches'] += 1
+
+        if key in self.cache:
+            self.stats['cache_hits'] += 1
+            return self.cache[key]
+
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, query))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.stats['coalesced'] += 1
+
+        # a caller going away (e.g. a closed stream) must not cancel the search the others are waiting for
+        return await asyncio.shield(task)
+
+    async def _fetch(self, key: tuple, query: str) -> dict:
+        self.stats['upstream_calls'] += 1
+        raw = await self.search_upstream(query)
+        if 'error' in raw:
+            # not cached, so that the next question tries again
+            return raw
+
+        results = [
+            {
+                'title': result.get('title'),
+                'url': result.get('url'),
+                'content': result.get('content'),
+                'published_date': result.get('published_date'),
+            }
+            for result in raw.get('results', [])
+        ]
+        unique = deduplicate(results)
+        self.stats['duplicates_removed'] += len(results) - len(unique)
+
+        res = {
+            'query': query,
+            'results': unique
+        }
+        self.cache[key] = res
+        return res
+
+# one front-end shared by the whole app
+news_search = NewsSearch()
@@ -0,0 +1,181 @@
+import asyncio
+import logging
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+import numpy as np
+
+from langchain_core.messages import HumanMessage, AIMessage
+from ulid import ULID
+
+from app.backend.core.config import settings
+from app.backend.services.redis_pool import get_redis_pool
+
+logger = logging.getLogger(__name__)
+
+# write-behind queue of the chat turns to persist: the turns of all sessions are written in batches,
+# with one embedding call and one Redis pipeline per batch. The queue is bounded, so that the chats wait
+# (backpressure) rather than piling up writes when Redis is slow, and it is flushed when the app shuts down.
+class PersistenceQueue:
+    def __init__(
+        self,
+        max_size: int = settings.persistence_queue_max_size,
+        batch_size: int = settings.persistence_batch_size,
+        max_retries: int = settings.persistence_max_retries,
+        retry_backoff_seconds: float = 0.5
+    ):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff_seconds = retry_backoff_seconds
+        self.worker: asyncio.Task = None
+        self.closed = False
+        # the blocking embedding of the messages (on CPU) runs one batch at a time
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='chat-persistence')
+        self.counts = {
+            'enqueued': 0,
+            'written': 0,
+            'failed': 0,
+            'batches': 0,
+            'retries': 0,
+        }
+        self.last_batch_size = 0
+        self.put_wait_seconds = 0.0
+
+    async def put(self, chat_history, messages: list[HumanMessage | AIMessage], metadata: list[dict[str, str]]):
+        '''
+        Queue a turn of a session to persist, waiting for room in the queue if it is full.
+
+        Args:
+            chat_history (ChatHistory): The chat history of the session
+            messages (list[HumanMessage | AIMessage]): The messages of the turn
+            metadata (list[dict[str, str]]): The metadata of every message, with at least its sender and session
+        '''
+        if self.closed:
+            raise RuntimeError("The persistence queue is closed")
+        if self.worker is None or self.worker.done():
+            if self.worker is not None and not self.worker.cancelled() and self.worker.exception() is not None:
+                logger.error("The persistence worker died, restarting it", exc_info=self.worker.exception())
+            # otherwise the queue would fill up and block the chats for good
+            self.worker = asyncio.create_task(self._run())
+
+        start = time.perf_counter()
+        await self.queue.put({
+            'history': chat_history,
+            'messages': messages,
+            'metadata': metadata,
+        })
+        self.put_wait_seconds += time.perf_counter() - start
+        self.counts['enqueued'] += 1
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            # whatever piled up while the previous batch was written goes in the same batch
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            try:
+                # only the vector store: the displayed history is the display log, appended to by the chat itself
+                written = await self._retry('vector store', self._write_vectors, batch)
+                self.counts['written' if written else 'failed'] += len(batch)
+                self.counts['batches'] += 1
+                self.last_batch_size = len(batch)
+            finally:
+                for _ in batch:
+                    self.queue.task_done()
+
+    async def _retry(self, name: str, write, batch: list[dict]) -> bool:
+        '''Write a batch, retrying with exponential backoff, and return whether it was written.'''
+        for attempt in range(self.max_retries + 1):
+            try:
+                await write(batch)
+                return True
+            except Exception:
+                if attempt == self.max_retries:
+                    logger.error("Could not write %d turns to the %s, dropping them", len(batch), name, exc_info=True)
+                    return False
+                self.counts['retries'] += 1
+                await asyncio.sleep(self.retry_backoff_seconds * 2 ** attempt)
+
+    async def _write_vectors(self, batch: list[dict]):
+        loop = asyncio.get_running_loop()
+        pipe = get_redis_pool().async_client.pipeline(transaction=False)
+
+        # sessions share the vector store (and so the embedding model), but group them in case they do not
+        groups = {}
+        for item in batch:
+            groups.setdefault(id(item['history'].vector_store), []).append(item)
+
+        for items in groups.values():
+            history = items[0]['history']
+            config = history.vector_store.config
+            texts = [message.content for item in items for message in item['messages']]
+            # one embedding call for all the messages of the batch
+            vectors = await loop.run_in_executor(self.executor, history.embeddings.embed_documents, texts)
+
+            vectors = iter(vectors)
+            for item in items:
+                # the keys are chosen once, so that a retry overwrites what a partly applied pipeline wrote
+                keys = item.setdefault('keys', [f"{config.key_prefix}:{ULID()}" for _ in item['messages']])
+                for key, message, meta in zip(keys, item['messages'], item['metadata']):
+                    pipe.hset(key, mapping={
+                        config.content_field: message.content,
+                        config.embedding_field: np.asarray(next(vectors), dtype='float32').tobytes(),
+                        **meta,
+                    })
+                # track the keys of the session, so that clearing it does not have to look for them
+                pipe.sadd(item['history'].keys_key, *keys)
+
+        await pipe.execute()
+
+    def stats(self) -> dict:
+        '''
+        Get the statistics of the queue.
+
+        Returns:
+            dict: The turns waiting, the size of the queue, the turns queued, written and dropped, the batches written,
+                the retries, the size of the last batch, and the total time the chats waited for room in the queue
+        '''
+        return {
+            'depth': self.queue.qsize(),
+            'max_size': self.queue.maxsize,
+            **self.counts,
+            'last_batch_size': self.last_batch_size,
+            'put_wait_seconds': round(self.put_wait_seconds, 3),
+        }
+
+    async def close(self, timeout: float = settings.persistence_flush_timeout_seconds):
+        '''
+        Stop accepting turns and wait for the queued ones to be written.
+
+        Args:
+            timeout (float): The maximum number of seconds to wait, after which the turns still queued are dropped
+        '''
+        self.closed = True
+        if self.worker is not None:
+            try:
+                await asyncio.wait_for(self.queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.error("Dropping %d turns not written within %g seconds of shutdown", self.queue.qsize(), timeout)
+            self.worker.cancel()
+        self.executor.shutdown(wait=True)
+
+_queue = None
+_queue_lock = Lock()
+
+def get_persistence_queue() -> PersistenceQueue:
+    '''Get the persistence queue used by the whole app, creating it on first use (e.g. outside of the app).'''
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = PersistenceQueue()
+        return _queue
+
+def set_persistence_queue(queue: PersistenceQueue):
+    '''Replace the persistence queue used by the whole app, e.g. by the one created in the app lifespan.'''
+    global _queue
+    with _queue_lock:
+        _queue = queue
@@ -0,0 +1,137 @@
+import asyncio
+import time
+
+import redis
+import redis.asyncio
+
+from threading import Lock
+
+from app.backend.core.config import settings
+
+# counts of a connection pool, kept by the pool itself rather than read from the private state of redis-py
+class _PoolCounts:
+    def __init__(self):
+        self.lock = Lock()
+        self.opened = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.wait_seconds = 0.0
+
+    def checked_out(self, waited: float):
+        with self.lock:
+            self.in_use += 1
+            self.checkouts += 1
+            self.wait_seconds += waited
+
+    def released(self):
+        with self.lock:
+            self.in_use -= 1
+
+    def stats(self, max_connections: int) -> dict:
+        with self.lock:
+            return {
+                'max_connections': max_connections,
+                'connections_opened': self.opened,
+                'connections_in_use': self.in_use,
+                'checkouts': self.checkouts,
+                'wait_seconds': round(self.wait_seconds, 3),
+            }
+
+class _CountingPool(redis.BlockingConnectionPool):
+    def __init__(self, *args, **kwargs):
+        self.counts = _PoolCounts()
+        super().__init__(*args, **kwargs)
+
+    def make_connection(self):
+        connection = super().make_connection()
+        with self.counts.lock:
+            self.counts.opened += 1
+        return connection
+
+    def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = super().get_connection(*args, **kwargs)
+        self.counts.checked_out(time.perf_counter() - start)
+        return connection
+
+    def release(self, connection):
+        super().release(connection)
+        self.counts.released()
+
+class _AsyncCountingPool(redis.asyncio.BlockingConnectionPool):
+    def __init__(self, *args, **kwargs):
+        self.counts = _PoolCounts()
+        super().__init__(*args, **kwargs)
+
+    def make_connection(self):
+        connection = super().make_connection()
+        with self.counts.lock:
+            self.counts.opened += 1
+        return connection
+
+    async def get_connection(self, *args, **kwargs):
+        start = time.perf_counter()
+        connection = await super().get_connection(*args, **kwargs)
+        self.counts.checked_out(time.perf_counter() - start)
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        self.counts.released()
+
+# connections to Redis shared by all chat sessions, so that the number of sockets is bounded by the pool size
+# rather than growing with the number of sessions. The langchain-redis wrappers are synchronous and use the
+# blocking client, which may wait for a free connection, so it is only used off the event loop (worker threads);
+# the async paths of the app use the async one.
+class RedisPool:
+    def __init__(
+        self,
+        url: str = settings.redis_url,
+        max_connections: int = settings.redis_max_connections,
+        timeout: float = settings.redis_pool_timeout_seconds
+    ):
+        # blocking pools make callers wait for a free connection instead of opening more than max_connections
+        self.pool = _CountingPool.from_url(url, max_connections=max_connections, timeout=timeout)
+        self.client = redis.Redis(connection_pool=self.pool)
+
+        self.async_pool = _AsyncCountingPool.from_url(url, max_connections=max_connections, timeout=timeout)
+        self.async_client = redis.asyncio.Redis(connection_pool=self.async_pool)
+
+    def stats(self) -> dict:
+        '''
+        Get the statistics of the connection pools.
+
+        Returns:
+            dict: For the sync and async pools, the maximum number of connections, the connections opened so far and in use,
+                the connections checked out so far and the total time spent waiting for one
+        '''
+        return {
+            'sync': self.pool.counts.stats(self.pool.max_connections),
+            'async': self.async_pool.counts.stats(self.async_pool.max_connections),
+        }
+
+    def _close_sync(self):
+        self.client.close()
+        self.pool.disconnect()
+
+    async def aclose(self):
+        await self.async_client.aclose()
+        # the blocking pool takes its lock to disconnect, keep it off the event loop
+        await asyncio.to_thread(self._close_sync)
+
+_pool = None
+_pool_lock = Lock()
+
+def get_redis_pool() -> RedisPool:
+    '''Get the Redis connections used by the whole app, creating them on first use (e.g. outside of the app).'''
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RedisPool()
+        return _pool
+
+def set_redis_pool(pool: RedisPool):
+    '''Replace the Redis connections used by the whole app, e.g. by the ones created in the app lifespan.'''
+    global _pool
+    with _pool_lock:
+        _pool = pool
@@ -0,0 +1,212 @@
+'''
+Precomputed fundamentals screener of the S&P 500 constituents.
+
+The screener table has one row per company with the latest value of every get_financial_information metric,
+so that screening questions ("top 10 ROE in Energy with D/E < 1") are answered from it instead of hundreds of live fetches.
+
+Build (or rebuild) the table with: python -m app.backend.services.screener
+The constituents list is the one exported by time_series/preprocessing/get_data.ipynb.
+'''
+import argparse
+import logging
+import os
+import re
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from threading import Lock
+
+import pandas as pd
+
+from app.backend.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# metrics of the screener table, with their latest value per company
+SCREENER_METRICS = [
+    'graham_number',
+    'discounted_cash_flow',
+    'roe',
+    'roa',
+    'pe_ratio',
+    'earnings_yield',
+    'debt_to_equity_ratio',
+    'debt_to_asset_ratio',
+    'gross_profit_margin',
+    'operating_margin',
+    'net_profit_margin',
+    'current_ratio',
+    'working_capital',
+    'current_price',
+]
+
+# a filter is a metric, a comparison and a number, e.g. "debt_to_equity_ratio < 1"
+FILTER_PATTERN = re.compile(r'^\s*(\w+)\s*(<=|>=|==|<|>)\s*(-?\d+(?:\.\d+)?)\s*$')
+
+def load_constituents(path: str = settings.sp500_constituents_path) -> pd.DataFrame:
+    '''
+    Load the S&P 500 constituents with their sector.
+
+    Args:
+        path (str): The csv of the constituents, as exported from Wikipedia by get_data.ipynb
+
+    Returns:
+        pd.DataFrame: The columns ticker, name, sector and sub_industry
+    '''
+    constituents = pd.read_csv(path)
+    constituents = constituents.rename(columns={
+        'Symbol': 'ticker',
+        'Security': 'name',
+        'GICS Sector': 'sector',
+        'GICS Sub-Industry': 'sub_industry',
+    })[['ticker', 'name', 'sector', 'sub_industry']]
+    # yfinance uses dashes instead of dots in tickers (e.g. BRK-B)
+    constituents['ticker'] = constituents['ticker'].str.replace('.', '-', regex=False)
+    return constituents
+
+def _screen_ticker(ticker: str) -> dict:
+    '''Calculate the latest value of every metric of a company, in a worker process.'''
+    # imported in the worker so that the pool does not have to pickle the agent tools
+    from app.backend.chatbot.agent_tools import financial_information
+
+    info = financial_information(ticker)
+    row = {'ticker': ticker}
+    for metric in SCREENER_METRICS:
+        value = info.get(metric)
+        if isinstance(value, dict):
+            # keep the latest fiscal date of the metric
+            row[metric] = value[max(value)] if value else None
+        else:
+            row[metric] = value
+    return row
+
+def build_screener(
+    constituents_path: str = settings.sp500_constituents_path,
+    output_path: str = settings.screener_path,
+    max_workers: int = settings.screener_max_workers
+) -> pd.DataFrame:
+    '''
+    Calculate the metrics of every constituent across a process pool and save the screener table.
+
+    Args:
+        constituents_path (str): The csv of the constituents
+        output_path (str): Where to save the screener table (parquet)
+        max_workers (int): The number of worker processes
+
+    Returns:
+        pd.DataFrame: The screener table
+    '''
+    constituents = load_constituents(constituents_path)
+
+    # create the market data database and its tables once in this process, before the workers race to create them
+    from app.backend.database import market_data
+    market_data.get_engine()
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_screen_ticker, ticker): ticker for ticker in constituents['ticker']}
+        for future in as_completed(futures):
+            try:
+                rows.append(future.result())
+            except Exception:
+                logger.warning("Could not screen %s", futures[future], exc_info=True)
+
+    metrics = pd.DataFrame(rows, columns=['ticker'] + SCREENER_METRICS)
+    metrics[SCREENER_METRICS] = metrics[SCREENER_METRICS].apply(pd.to_numeric, errors='coerce').astype('float32')
+
+    screener = constituents.merge(metrics, on='ticker', how='inner')
+    screener[['sector', 'sub_industry']] = screener[['sector', 'sub_industry']].astype('category')
+    screener = screener.sort_values(['sector', 'ticker']).reset_index(drop=True)
+
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    screener.to_parquet(output_path, index=False)
+
+    return screener
+
+# the screener table is only read again when it is rebuilt
+_screener_cache: dict[str, tuple[float, pd.DataFrame]] = {}
+_screener_lock = Lock()
+
+def load_screener(path: str = settings.screener_path) -> pd.DataFrame:
+    '''
+    Load the screener table, from memory unless the file changed.
+
+    Args:
+        path (str): The screener table (parquet)
+
+    Returns:
+        pd.DataFrame: The screener table
+    '''
+    modified = os.path.getmtime(path)
+    with _screener_lock:
+        cached = _screener_cache.get(path)
+        if cached is None or cached[0] != modified:
+            cached = (modified, pd.read_parquet(path))
+            _screener_cache[path] = cached
+        return cached[1]
+
+def query_screener(
+    sector: str = None,
+    filters: list[str] = None,
+    sort_by: str = 'roe',
+    ascending: bool = False,
+    limit: int = 10,
+    path: str = settings.screener_path
+) -> list[dict]:
+    '''
+    Screen the companies of the screener table.
+
+    Args:
+        sector (str): Only keep the companies of this GICS sector (case insensitive, partial match), or None for all sectors
+        filters (list[str]): Conditions all companies must meet, each one a metric, a comparison and a number, e.g. "debt_to_equity_ratio < 1"
+        sort_by (str): The metric to rank the companies by
+        ascending (bool): Whether to rank from the lowest value instead of the highest
+        limit (int): The maximum number of companies to return
+        path (str): The screener table (parquet)
+
+    Returns:
+        list[dict]: The ranked companies, with their name, sector and metrics
+    '''
+    if sort_by not in SCREENER_METRICS:
+        raise ValueError(f"Unknown metric to sort by: {sort_by}. Choose one of {', '.join(SCREENER_METRICS)}")
+
+    screener = load_screener(path)
+    mask = pd.Series(True, index=screener.index)
+
+    if sector:
+        mask &= screener['sector'].astype(str).str.contains(sector, case=False, regex=False)
+
+    for condition in filters or []:
+        match = FILTER_PATTERN.match(condition)
+        if match is None or match.group(1) not in SCREENER_METRICS:
+            raise ValueError(f"Invalid filter: {condition}. Use a metric, a comparison and a number, e.g. 'debt_to_equity_ratio < 1'")
+        metric, comparison, value = match.group(1), match.group(2), float(match.group(3))
+        column = screener[metric]
+        mask &= {
+            '<': column < value,
+            '<=': column <= value,
+            '>': column > value,
+            '>=': column >= value,
+            '==': column == value,
+        }[comparison]
+
+    res = screener[mask & screener[sort_by].notna()].sort_values(sort_by, ascending=ascending).head(limit)
+    res = res.astype({'sector': str, 'sub_industry': str})
+    res[SCREENER_METRICS] = res[SCREENER_METRICS].astype('float64').round(2)
+    # missing metrics as None rather than NaN, which is not valid JSON
+    res = res.astype(object).where(res.notna(), None)
+
+    return res.to_dict(orient='records')
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--constituents', default=settings.sp500_constituents_path)
+    parser.add_argument('--output', default=settings.screener_path)
+    parser.add_argument('--workers', type=int, default=settings.screener_max_workers)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    screener = build_screener(args.constituents, args.output, args.workers)
+    logger.info("Screened %d companies into %s", len(screener), args.output)
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,15 @@
 import time
 
-from langchain_huggingface import HuggingFaceEmbeddings
+from functools import cached_property
+
+from langchain_redis import RedisVectorStore
 
 from typing import Dict, Tuple
 
 from app.backend.chatbot.InvestingChatBot import InvestingChatBot
-from app.backend.chatbot.ChatHistory import ChatHistory
+from app.backend.chatbot.ChatHistory import ChatHistory, create_chat_vector_store
+from app.backend.chatbot.CachedEmbeddings import CachedEmbeddings
+from app.backend.chatbot.embedding_backends import chat_index_name, get_embeddings
 
 SESSION_TIMEOUT_SECONDS = 30 * 60  # 30 minutes
 
@@ -14,8 +18,15 @@ class SessionManager:
         # sessions: session_id -> (ChatHistory, last_access_time)
         self.sessions: Dict[str, Tuple[ChatHistory, str]] = {}
 
-        # intialize embedding model to embed user messages: one embedding model for all sessions
-        self.embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-mpnet-base-v2")
+        # intialize embedding model to embed user messages: one embedding model for all sessions, of the configured backend
+        # repeated messages and queries are not embedded again
+        self.embeddings: CachedEmbeddings = get_embeddings()
+
+    @cached_property
+    def vector_store(self) -> RedisVectorStore:
+        # one vector index for the messages of all sessions, created on the first chat rather than per user
+        # named after the model, so that a backend of another dimension does not attach to the index of another
+        return create_chat_vector_store(self.embeddings, index_name=chat_index_name())
 
     # this method should be called everytime user calls the chat endpoint from the frontend
     def get_or_create_history(self, session_id: str) -> ChatHistory:
@@ -36,7 +47,7 @@ class SessionManager:
             self.sessions[session_id] = (history, now)  # update last access time
             return history
         else:
-            history = ChatHistory(session_id=session_id, embeddings=self.embeddings)
+            history = ChatHistory(session_id=session_id, embeddings=self.embeddings, vector_store=self.vector_store)
             self.sessions[session_id] = (history, now)
             return history
         
@@ -0,0 +1,84 @@
+'''
+Tests of the chat history against Redis Stack (skipped when it is not reachable):
+    docker run -d -p 6379:6379 redis/redis-stack:latest
+    python -m pytest tests
+'''
+import os
+
+import pytest
+
+# the settings need the API keys, which the tests never use
+for name in ('GROQ_API_KEY', 'GOOGLE_API_KEY', 'TAVILY_API_KEY', 'JWT_SECRET_KEY'):
+    os.environ.setdefault(name, 'test')
+
+redis = pytest.importorskip('redis')
+pytest.importorskip('langchain_redis')
+
+import numpy as np
+
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from ulid import ULID
+
+from app.backend.core.config import settings
+
+DIM = 16
+
+EMBEDDINGS = DeterministicFakeEmbedding(size=DIM)
+
+@pytest.fixture(scope='module')
+def client():
+    client = redis.Redis.from_url(settings.redis_url)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        pytest.skip(f'no Redis at {settings.redis_url}')
+    return client
+
+@pytest.fixture
+def store(client):
+    from app.backend.chatbot.ChatHistory import create_chat_vector_store
+
+    # a scratch index, so that the tests never touch the chat index of the app
+    index_name = f'chat_messages_test_{ULID()}'
+    store = create_chat_vector_store(EMBEDDINGS, index_name=index_name)
+    yield store
+    client.ft(index_name).dropindex(delete_documents=True)
+
+def _add_messages(client, history, count: int, tracked: bool = True) -> list[str]:
+    '''Write messages of a session as the persistence queue does, tracked in the key set of the session or not.'''
+    keys = []
+    for i in range(count):
+        keys.append(f"{history.vector_store.config.key_prefix}:{ULID()}")
+        client.hset(keys[-1], mapping={
+            'text': f'message {i} of {history.session_id}',
+            'embedding': np.random.default_rng(i).standard_normal(DIM).astype('float32').tobytes(),
+            'sender': 'human' if i % 2 == 0 else 'ai',
+            'session_id': history.session_id,
+        })
+    if tracked and keys:
+        client.sadd(history.keys_key, *keys)
+    return keys
+
+def test_clear_history_removes_the_session_only(client, store):
+    from app.backend.chatbot.ChatHistory import ChatHistory
+
+    cleared = ChatHistory(session_id=f'test-{ULID()}', embeddings=EMBEDDINGS, vector_store=store)
+    kept = ChatHistory(session_id=f'test-{ULID()}', embeddings=EMBEDDINGS, vector_store=store)
+    try:
+        # messages written before the key sets were tracked are only found through the session tag
+        cleared_keys = _add_messages(client, cleared, 25) + _add_messages(client, cleared, 5, tracked=False)
+        kept_keys = _add_messages(client, kept, 10)
+        client.rpush(cleared.display_key, 'entry')
+        client.rpush(kept.display_key, 'entry')
+
+        cleared.clear_history()
+
+        assert client.exists(*cleared_keys) == 0
+        assert not client.exists(cleared.keys_key)
+        assert not client.exists(cleared.display_key)
+
+        assert client.exists(*kept_keys) == len(kept_keys)
+        assert client.smembers(kept.keys_key) == {key.encode() for key in kept_keys}
+        assert client.exists(kept.display_key)
+    finally:
+        client.unlink(kept.keys_key, kept.display_key, cleared.keys_key, cleared.display_key)